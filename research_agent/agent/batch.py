@@ -0,0 +1,218 @@
+import copy
+import csv
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List
+
+from .cache import CacheStore
+from .cli import build_parser, init_process, replay_layer, run_job
+from .extract import shutdown_parse_pool
+from .http import configure_session
+from .llm import get_llm_stats
+from .log import get_logger
+
+
+logger = get_logger(__name__)
+
+LENGTHS = ("short", "medium", "long")
+
+
+@dataclass
+class BatchJob:
+    job_id: str
+    topic: str
+    # Empty fields fall back to the batch's command-line flags.
+    audience: str = ""
+    length: str = ""
+    urls: str = ""
+
+
+def _slug(text: str, limit: int = 40) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:limit].rstrip("-") or "job"
+
+
+def parse_job(row: Dict[str, Any], n: int, where: str) -> BatchJob:
+    """Validate one job record; `n` numbers jobs without an id and `where` prefixes errors."""
+    topic = str(row.get("topic") or "").strip()
+    if not topic:
+        raise ValueError(f"{where}: job has no topic")
+    length = str(row.get("length") or "").strip()
+    if length and length not in LENGTHS:
+        raise ValueError(f"{where}: length must be one of {', '.join(LENGTHS)}, got {length!r}")
+    urls = row.get("urls") or ""
+    if isinstance(urls, list):
+        urls = ",".join(str(u) for u in urls)
+    job_id = str(row.get("id") or "").strip() or f"{n:04d}-{_slug(topic)}"
+    audience = str(row.get("audience") or "").strip()
+    return BatchJob(job_id=_slug(job_id, 80), topic=topic, audience=audience, length=length, urls=str(urls))
+
+
+def load_jobs(path: Path) -> List[BatchJob]:
+    """
+    Read jobs from a CSV file (header row) or JSONL (one object per line; blank
+    lines and `#` comments skipped). Fields: topic (required), audience, length,
+    urls (comma-separated, or a list in JSONL) and id (the job's output
+    directory name).
+    """
+    path = Path(path)
+    jobs: List[BatchJob] = []
+    if path.suffix.lower() == ".csv":
+        with path.open(newline="", encoding="utf-8") as f:
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                jobs.append(parse_job(row, len(jobs) + 1, f"{path}:{line_no}"))
+    else:
+        for line_no, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: {e}") from None
+            jobs.append(parse_job(row, len(jobs) + 1, f"{path}:{line_no}"))
+    seen = set()
+    for job in jobs:
+        if job.job_id in seen:
+            raise ValueError(f"{path}: duplicate job id {job.job_id!r}")
+        seen.add(job.job_id)
+    return jobs
+
+
+def job_args(base, job: BatchJob):
+    """The command-line namespace `base` with this job's fields and `<outdir>/jobs/<id>` output directory."""
+    args = copy.copy(base)
+    args.topic = job.topic
+    args.audience = job.audience or base.audience
+    args.length = job.length or base.length
+    args.urls = job.urls or base.urls
+    args.outdir = str(Path(base.outdir) / "jobs" / job.job_id)
+    args.chrome_trace = str(Path(args.outdir) / "chrome_trace.json") if base.chrome_trace else ""
+    return args
+
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def _run_one(base, job: BatchJob, cache: CacheStore) -> Dict[str, Any]:
+    args = job_args(base, job)
+    outdir = Path(args.outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    logger.info("Batch job %s started topic=%r", job.job_id, job.topic)
+    started = time.perf_counter()
+    try:
+        summary = run_job(args, outdir, cache)
+    except Exception as e:
+        logger.exception("Batch job %s failed", job.job_id)
+        summary = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+    result = {"id": job.job_id, "topic": job.topic, "wall_s": round(time.perf_counter() - started, 3), **summary}
+    manifest_path = outdir / "run_manifest.json"
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        result["llm"] = manifest["llm"]["totals"]
+        result["cache"] = manifest["cache"]
+    logger.info("Batch job %s %s in %.1fs", job.job_id, result["status"], result["wall_s"])
+    return result
+
+
+def _aggregate(results: List[Dict[str, Any]], wall_s: float, llm_stats: Dict[str, int]) -> Dict[str, Any]:
+    ok = [r for r in results if r["status"] == "ok"]
+    llm_totals: Dict[str, float] = {}
+    cache: Dict[str, Dict[str, int]] = {}
+    for r in results:
+        for name, value in r.get("llm", {}).items():
+            llm_totals[name] = llm_totals.get(name, 0) + value
+        for namespace, stats in r.get("cache", {}).items():
+            agg = cache.setdefault(namespace, {"hits": 0, "misses": 0})
+            agg["hits"] += stats.get("hits", 0)
+            agg["misses"] += stats.get("misses", 0)
+    for agg in cache.values():
+        lookups = agg["hits"] + agg["misses"]
+        agg["hit_ratio"] = round(agg["hits"] / lookups, 3) if lookups else None
+    job_times = [r["wall_s"] for r in results]
+    return {
+        "jobs": len(results),
+        "ok": len(ok),
+        "failed": len(results) - len(ok),
+        "wall_s": round(wall_s, 3),
+        "jobs_per_min": round(len(ok) / wall_s * 60, 2) if wall_s else 0.0,
+        "job_wall_s": {
+            "p50": _percentile(job_times, 0.5),
+            "p95": _percentile(job_times, 0.95),
+            "max": max(job_times, default=0.0),
+        },
+        "sources": sum(r.get("sources", 0) for r in ok),
+        "notes": sum(r.get("notes", 0) for r in ok),
+        "llm": llm_totals,
+        # Process-wide: identical prompts shared across jobs.
+        "llm_shared": {k: llm_stats.get(k, 0) for k in ("memo_hits", "coalesced")},
+        "cache": cache,
+        "results": results,
+    }
+
+
+def run_batch(jobs: List[BatchJob], base, cache: CacheStore, workers: int = 4) -> Dict[str, Any]:
+    """
+    Run `jobs` with up to `workers` reports in flight. All jobs share this
+    process's LLM client, rate limiter, call policy and memo, the HTTP session
+    and per-host limits, and `cache`. Each job writes its own output directory
+    (`<outdir>/jobs/<job id>/`) and manifest. A failed job is recorded and the
+    batch continues. Returns the aggregate summary, also written to
+    `<outdir>/batch_summary.json`.
+    """
+    root = Path(base.outdir)
+    root.mkdir(parents=True, exist_ok=True)
+    logger.info("Batch of %d job(s) workers=%d outdir=%s", len(jobs), workers, root)
+    llm_before = get_llm_stats()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="job") as pool:
+        results = list(pool.map(lambda job: _run_one(base, job, cache), jobs))
+    llm_after = get_llm_stats()
+    llm_stats = {k: v - llm_before.get(k, 0) for k, v in llm_after.items()}
+    summary = _aggregate(results, time.perf_counter() - started, llm_stats)
+    (root / "batch_summary.json").write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+    logger.info("Wrote batch summary %s", root / "batch_summary.json")
+    return summary
+
+
+def main() -> None:
+    p = build_parser(description="Batch mode: many reports in one process", require_topic=False)
+    p.add_argument("--jobs", required=True, help="JSONL or CSV file of jobs (topic, audience, length, urls, id)")
+    p.add_argument("--job-workers", type=int, default=4, help="Reports generated concurrently")
+    args = p.parse_args()
+    if args.topic:
+        p.error("--topic is set per job in batch mode; list topics in --jobs")
+    try:
+        jobs = load_jobs(Path(args.jobs))
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"Cannot read jobs: {e}")
+    init_process(args)
+    # One pooled session serves every job's fetch workers.
+    configure_session(pool_maxsize=max(args.fetch_workers, args.per_host) * max(1, args.job_workers))
+    cache = CacheStore(outdir=Path(args.outdir), enabled=not args.no_cache, backend=args.cache_backend)
+    try:
+        with replay_layer(args):
+            summary = run_batch(jobs, args, cache, workers=args.job_workers)
+    finally:
+        shutdown_parse_pool()
+        cache.close()
+
+    print(
+        f"Batch: {summary['ok']}/{summary['jobs']} job(s) ok in {summary['wall_s']:.1f}s "
+        f"({summary['jobs_per_min']:.1f} report(s)/min; per job p50 {summary['job_wall_s']['p50']:.1f}s, "
+        f"p95 {summary['job_wall_s']['p95']:.1f}s)"
+    )
+    llm_totals = summary["llm"]
+    print(
+        f"LLM: {int(llm_totals.get('calls', 0))} call(s), {int(llm_totals.get('input_tokens', 0))} input / "
+        f"{int(llm_totals.get('output_tokens', 0))} output token(s); shared across jobs: "
+        f"{summary['llm_shared']['memo_hits']} memo hit(s), {summary['llm_shared']['coalesced']} coalesced"
+    )
+    for r in summary["results"]:
+        if r["status"] != "ok":
+            print(f"- {r['id']}: {r.get('error', r['status'])}")
+    print(f"✅ Wrote {Path(args.outdir) / 'batch_summary.json'}")
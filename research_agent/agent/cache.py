@@ -1,41 +1,485 @@
 import hashlib
 import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
 
 from .log import get_logger
+from .trace import get_tracer
 
 
 logger = get_logger(__name__)
 
 
+@dataclass
+class NamespacePolicy:
+    ttl_s: Optional[float] = None
+    max_bytes: Optional[int] = None
+
+
+BLOB_NAMESPACE = "blobs"
+
+DEFAULT_POLICIES: Dict[str, NamespacePolicy] = {
+    "fetch": NamespacePolicy(max_bytes=64 * 1024 * 1024),
+    BLOB_NAMESPACE: NamespacePolicy(max_bytes=256 * 1024 * 1024),
+}
+
+
+def _digest(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(raw: bytes) -> Any:
+    return json.loads(raw)
+
+
+# Called with (namespace, key) for each entry a backend evicts, so the memory tier can drop it.
+EvictCallback = Callable[[str, str], None]
+
+
+class MemoryLRU:
+    """Small in-process front tier. Values are shared, so callers must treat them as read-only."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[float, Any]]:
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            item = self._data.get((namespace, key))
+            if item is not None:
+                self._data.move_to_end((namespace, key))
+            return item
+
+    def set(self, namespace: str, key: str, stored_at: float, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[(namespace, key)] = (stored_at, value)
+            self._data.move_to_end((namespace, key))
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def discard(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+
+class FileBackend:
+    """
+    Legacy layout: one JSON file per entry under cache/<namespace>/<sha256>.json.
+    Namespaces with a byte cap are trimmed least-recently-used first, by access
+    time; reads set it explicitly so it does not depend on mount options.
+    """
+
+    name = "file"
+    # Access times are only rewritten when older than this, to keep reads cheap.
+    TOUCH_GRANULARITY_S = 60.0
+
+    def __init__(self, base_dir: Path, on_evict: Optional[EvictCallback] = None):
+        self.base_dir = base_dir
+        self.on_evict = on_evict
+        self._known_dirs = set()
+        # Serialises writes to capped namespaces with their byte accounting.
+        self._lock = threading.Lock()
+        self._ns_bytes: Dict[str, int] = {}
+
+    def _path_for_key(self, namespace: str, key: str, create: bool = False) -> Path:
+        ns_dir = self.base_dir / namespace
+        if create and namespace not in self._known_dirs:
+            ns_dir.mkdir(parents=True, exist_ok=True)
+            self._known_dirs.add(namespace)
+        return ns_dir / f"{_digest(key)}.json"
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[float, Any]]:
+        path = self._path_for_key(namespace, key)
+        try:
+            raw = path.read_bytes()
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        self._touch(path, stat)
+        return stat.st_mtime, _loads(raw).get("value")
+
+    def _touch(self, path: Path, stat: os.stat_result) -> None:
+        now = time.time()
+        if now - stat.st_atime > self.TOUCH_GRANULARITY_S:
+            try:
+                # mtime is the stored-at time used for TTLs, so only atime moves.
+                os.utime(path, (now, stat.st_mtime))
+            except FileNotFoundError:
+                pass
+
+    def _write_atomic(self, path: Path, raw: bytes) -> None:
+        # Write to a sibling temp file and rename, so readers never see a partial entry.
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(raw)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def _write_capped(self, namespace: str, path: Path, raw: bytes, policy: NamespacePolicy) -> None:
+        if policy.max_bytes is None:
+            self._write_atomic(path, raw)
+            return
+        with self._lock:
+            total = self._namespace_bytes(namespace)
+            try:
+                total -= path.stat().st_size
+            except FileNotFoundError:
+                pass
+            self._write_atomic(path, raw)
+            total += len(raw)
+            if total > policy.max_bytes:
+                total = self._evict(namespace, total, policy.max_bytes)
+            self._ns_bytes[namespace] = total
+
+    def _files(self, namespace: str) -> Iterator[Path]:
+        ns_dir = self.base_dir / namespace
+        return ns_dir.glob("*/*.z" if namespace == BLOB_NAMESPACE else "*.json")
+
+    def _namespace_bytes(self, namespace: str) -> int:
+        if namespace not in self._ns_bytes:
+            total = 0
+            for path in self._files(namespace):
+                try:
+                    total += path.stat().st_size
+                except FileNotFoundError:
+                    pass
+            self._ns_bytes[namespace] = total
+        return self._ns_bytes[namespace]
+
+    def _evict(self, namespace: str, total: int, max_bytes: int) -> int:
+        entries = []
+        for path in self._files(namespace):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+        entries.sort(key=lambda e: e[0])
+        evicted = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            key = path.stem
+            if namespace != BLOB_NAMESPACE:
+                try:
+                    key = _loads(path.read_bytes()).get("cache_key", key)
+                except (OSError, ValueError):
+                    pass
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+            if self.on_evict is not None:
+                self.on_evict(namespace, key)
+        logger.debug("Cache evicted namespace=%s entries=%d", namespace, evicted)
+        return total
+
+    def set(self, namespace: str, key: str, value: Any, policy: NamespacePolicy) -> float:
+        path = self._path_for_key(namespace, key, create=True)
+        self._write_capped(namespace, path, _dumps({"cache_key": key, "value": value}), policy)
+        return time.time()
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.base_dir / BLOB_NAMESPACE / digest[:2] / f"{digest}.z"
+
+    def has_blob(self, digest: str) -> bool:
+        return self._blob_path(digest).exists()
+
+    def get_blob(self, digest: str) -> Optional[bytes]:
+        path = self._blob_path(digest)
+        try:
+            data = path.read_bytes()
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        self._touch(path, stat)
+        return data
+
+    def put_blob(self, digest: str, data: bytes, policy: NamespacePolicy) -> None:
+        path = self._blob_path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_capped(BLOB_NAMESPACE, path, data, policy)
+
+    def delete(self, namespace: str, key: str) -> None:
+        path = self._path_for_key(namespace, key)
+        with self._lock:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                return
+            if namespace in self._ns_bytes:
+                self._ns_bytes[namespace] -= size
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteBackend:
+    """
+    Single-file indexed store (cache/cache.sqlite3, WAL mode). Each `set` is one
+    transaction, so a crash never leaves a half-written entry. Namespaces with a
+    byte cap are trimmed least-recently-used first.
+    """
+
+    name = "sqlite"
+    # Access times are only rewritten when older than this, to keep reads cheap.
+    TOUCH_GRANULARITY_S = 60.0
+
+    def __init__(self, base_dir: Path, on_evict: Optional[EvictCallback] = None):
+        self.path = base_dir / "cache.sqlite3"
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        created = not self.path.exists()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                cache_key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, digest)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (namespace, accessed_at)")
+        self._ns_bytes: Dict[str, int] = {}
+        if created:
+            self._import_files(base_dir)
+
+    def _import_files(self, base_dir: Path) -> None:
+        """
+        Copy entries from the per-file layout into a newly created database, so
+        switching backends keeps an existing cache. Stored-at times come from the
+        file mtimes; the files are left in place for the file backend.
+        """
+        files = FileBackend(base_dir)
+        namespaces = [p.name for p in base_dir.iterdir() if p.is_dir()]
+        rows = []
+        for namespace in namespaces:
+            for path in files._files(namespace):
+                try:
+                    raw = path.read_bytes()
+                    stat = path.stat()
+                    if namespace == BLOB_NAMESPACE:
+                        key, value = path.stem, raw
+                    else:
+                        payload = _loads(raw)
+                        key, value = payload["cache_key"], _dumps(payload.get("value"))
+                except (OSError, ValueError, KeyError, TypeError):
+                    continue
+                digest = path.stem
+                rows.append((namespace, digest, key, value, len(value), stat.st_mtime, stat.st_atime))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.execute("COMMIT")
+        logger.info("Cache imported %d file entr%s into %s", len(rows), "y" if len(rows) == 1 else "ies", self.path)
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[float, Any]]:
+        row = self._get_raw(namespace, _digest(key))
+        return None if row is None else (row[0], _loads(row[1]))
+
+    def _get_raw(self, namespace: str, digest: str) -> Optional[Tuple[float, bytes]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, stored_at, accessed_at FROM entries WHERE namespace=? AND digest=?",
+                (namespace, digest),
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[2] > self.TOUCH_GRANULARITY_S:
+                self._conn.execute(
+                    "UPDATE entries SET accessed_at=? WHERE namespace=? AND digest=?", (now, namespace, digest)
+                )
+        return row[1], row[0]
+
+    def _namespace_bytes(self, namespace: str) -> int:
+        if namespace not in self._ns_bytes:
+            row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries WHERE namespace=?", (namespace,)).fetchone()
+            self._ns_bytes[namespace] = int(row[0])
+        return self._ns_bytes[namespace]
+
+    def set(self, namespace: str, key: str, value: Any, policy: NamespacePolicy) -> float:
+        return self._set_raw(namespace, _digest(key), key, _dumps(value), policy)
+
+    def _set_raw(self, namespace: str, digest: str, key: str, raw: bytes, policy: NamespacePolicy) -> float:
+        now = time.time()
+        with self._lock:
+            total = self._namespace_bytes(namespace)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                old = self._conn.execute(
+                    "SELECT size FROM entries WHERE namespace=? AND digest=?", (namespace, digest)
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (namespace, digest, key, raw, len(raw), now, now),
+                )
+                total += len(raw) - (old[0] if old else 0)
+                if policy.max_bytes is not None and total > policy.max_bytes:
+                    total = self._evict(namespace, total, policy.max_bytes)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                self._ns_bytes.pop(namespace, None)
+                raise
+            self._ns_bytes[namespace] = total
+        return now
+
+    def _evict(self, namespace: str, total: int, max_bytes: int) -> int:
+        evicted = 0
+        rows = self._conn.execute(
+            "SELECT digest, cache_key, size FROM entries WHERE namespace=? ORDER BY accessed_at ASC", (namespace,)
+        )
+        victims, keys = [], []
+        for digest, key, size in rows:
+            if total <= max_bytes:
+                break
+            victims.append((namespace, digest))
+            keys.append(key)
+            total -= size
+            evicted += 1
+        self._conn.executemany("DELETE FROM entries WHERE namespace=? AND digest=?", victims)
+        if self.on_evict is not None:
+            for key in keys:
+                self.on_evict(namespace, key)
+        logger.debug("Cache evicted namespace=%s entries=%d", namespace, evicted)
+        return total
+
+    def has_blob(self, digest: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM entries WHERE namespace=? AND digest=?", (BLOB_NAMESPACE, digest)
+            ).fetchone()
+        return row is not None
+
+    def get_blob(self, digest: str) -> Optional[bytes]:
+        row = self._get_raw(BLOB_NAMESPACE, digest)
+        return None if row is None else row[1]
+
+    def put_blob(self, digest: str, data: bytes, policy: NamespacePolicy) -> None:
+        self._set_raw(BLOB_NAMESPACE, digest, digest, data, policy)
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE namespace=? AND digest=?", (namespace, _digest(key)))
+            self._ns_bytes.pop(namespace, None)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+BACKENDS = {
+    FileBackend.name: FileBackend,
+    SQLiteBackend.name: SQLiteBackend,
+}
+
+
 class CacheStore:
-    def __init__(self, outdir: Path, enabled: bool = True):
+    def __init__(
+        self,
+        outdir: Path,
+        enabled: bool = True,
+        backend: str = "sqlite",
+        memory_entries: int = 256,
+        policies: Optional[Dict[str, NamespacePolicy]] = None,
+    ):
         self.enabled = enabled
         self.base_dir = Path(outdir) / "cache"
         self.base_dir.mkdir(parents=True, exist_ok=True)
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown cache backend {backend!r}; expected one of {sorted(BACKENDS)}")
+        self.memory = MemoryLRU(memory_entries)
+        # Evicted entries must not keep being served from the memory tier.
+        self.backend = BACKENDS[backend](self.base_dir, on_evict=self.memory.discard)
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        # Lookups per namespace, reported in run_manifest.json.
+        self.stats: Dict[str, Counter] = defaultdict(Counter)
+        self._stats_lock = threading.Lock()
 
-    def _path_for_key(self, namespace: str, key: str) -> Path:
-        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
-        ns_dir = self.base_dir / namespace
-        ns_dir.mkdir(parents=True, exist_ok=True)
-        return ns_dir / f"{digest}.json"
+    def policy(self, namespace: str) -> NamespacePolicy:
+        return self.policies.get(namespace) or NamespacePolicy()
+
+    def _expired(self, namespace: str, stored_at: float) -> bool:
+        ttl = self.policy(namespace).ttl_s
+        return ttl is not None and time.time() - stored_at > ttl
 
     def get(self, namespace: str, key: str) -> Optional[Any]:
         if not self.enabled:
             return None
-        path = self._path_for_key(namespace, key)
-        if not path.exists():
+        item = self.memory.get(namespace, key)
+        if item is None:
+            item = self.backend.get(namespace, key)
+            if item is not None:
+                self.memory.set(namespace, key, *item)
+        if item is not None and self._expired(namespace, item[0]):
+            logger.debug("Cache expired namespace=%s key=%s", namespace, key)
+            self.memory.discard(namespace, key)
+            self.backend.delete(namespace, key)
+            item = None
+        kind = "misses" if item is None else "hits"
+        with self._stats_lock:
+            self.stats[namespace][kind] += 1
+        get_tracer().add(f"cache.{namespace}.{kind}")
+        if item is None:
             logger.debug("Cache miss namespace=%s key=%s", namespace, key)
             return None
-        payload = json.loads(path.read_text(encoding="utf-8"))
         logger.debug("Cache hit namespace=%s key=%s", namespace, key)
-        return payload.get("value")
+        return item[1]
 
     def set(self, namespace: str, key: str, value: Any) -> None:
         if not self.enabled:
             return
-        path = self._path_for_key(namespace, key)
-        payload = {"cache_key": key, "value": value}
-        path.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+        stored_at = self.backend.set(namespace, key, value, self.policy(namespace))
+        self.memory.set(namespace, key, stored_at, value)
         logger.debug("Cache store namespace=%s key=%s", namespace, key)
+
+    def put_blob(self, data: bytes) -> Optional[str]:
+        """
+        Store `data` compressed and addressed by its SHA-256. Identical bodies (mirrored
+        or syndicated pages) are stored once. Returns the digest, or None when disabled.
+        """
+        if not self.enabled:
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.backend.has_blob(digest):
+            self.backend.put_blob(digest, zlib.compress(data, 6), self.policy(BLOB_NAMESPACE))
+            logger.debug("Blob store digest=%s bytes=%d", digest, len(data))
+        return digest
+
+    def get_blob(self, digest: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        data = self.backend.get_blob(digest)
+        return None if data is None else zlib.decompress(data)
+
+    def close(self) -> None:
+        self.backend.close()
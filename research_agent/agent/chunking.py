@@ -0,0 +1,97 @@
+import re
+import zlib
+from dataclasses import dataclass
+from typing import List
+
+from .tokens import count_tokens
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class ChunkConfig:
+    # Documents up to this many chars use a single extraction call, as before.
+    single_call_chars: int = 12000
+    target_chars: int = 6000
+    overlap_chars: int = 600
+    workers: int = 4
+    # Per-source spend on chunk inputs; whichever of the two is tighter wins.
+    token_budget: int = 30000
+    max_cost_usd: float = 0.0
+    usd_per_1k_tokens: float = 0.0
+    # Jaccard threshold for merging the notes of overlapping chunks; 0 keeps them all.
+    dedup_threshold: float = 0.5
+
+    def effective_token_budget(self) -> int:
+        budget = self.token_budget if self.token_budget > 0 else None
+        if self.max_cost_usd > 0 and self.usd_per_1k_tokens > 0:
+            by_cost = int(self.max_cost_usd / self.usd_per_1k_tokens * 1000)
+            budget = by_cost if budget is None else min(budget, by_cost)
+        return budget or 0
+
+
+def _sentences(text: str, max_chars: int) -> List[str]:
+    out = []
+    for sentence in _SENTENCE_END.split(text):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            out.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            out.append(sentence)
+    return out
+
+
+def chunk_text(text: str, target_chars: int = 6000, overlap_chars: int = 600) -> List[str]:
+    """
+    Content-defined chunking. A boundary falls after a sentence whose hash falls
+    below a threshold proportional to its length (once the chunk is at least half
+    the target size), or when the chunk reaches twice the target. Boundaries depend only on nearby text, so an
+    edit to one part of a page leaves the other chunks byte-identical and their
+    cached extractions reusable. Each chunk is prefixed with the tail of the
+    previous one (`overlap_chars`) so facts spanning a boundary are not lost.
+    """
+    sentences = _sentences(text, max(1, target_chars))
+    # A sentence is a mark with probability proportional to its length, so past the
+    # minimum size a boundary comes on average every target_chars / 2 chars. The test
+    # uses only the sentence and `target_chars`, never document-wide statistics.
+    modulus = max(1, target_chars)
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for sentence in sentences:
+        current.append(sentence)
+        size += len(sentence) + 1
+        at_mark = zlib.crc32(sentence.encode("utf-8")) % modulus < 2 * len(sentence)
+        if (size >= target_chars // 2 and at_mark) or size >= target_chars * 2:
+            chunks.append(" ".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append(" ".join(current))
+
+    if overlap_chars <= 0:
+        return chunks
+    with_overlap = chunks[:1]
+    for prev, chunk in zip(chunks, chunks[1:]):
+        tail = prev[-overlap_chars:]
+        space = tail.find(" ")
+        tail = tail[space + 1 :] if 0 <= space < len(tail) - 1 else tail
+        with_overlap.append(f"{tail} {chunk}")
+    return with_overlap
+
+
+def select_chunks(chunks: List[str], token_budget: int) -> List[str]:
+    """Keep chunks in document order until the token budget is spent (0 means no limit)."""
+    if token_budget <= 0:
+        return list(chunks)
+    selected = []
+    used = 0
+    for chunk in chunks:
+        cost = count_tokens(chunk)
+        if selected and used + cost > token_budget:
+            break
+        selected.append(chunk)
+        used += cost
+    return selected
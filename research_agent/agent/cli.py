@@ -1,24 +1,32 @@
 import argparse
+import contextlib
+import json
 import os
 import re
+from dataclasses import asdict
 from pathlib import Path
-from typing import List
-
-from dotenv import load_dotenv
+from typing import List, Optional
 
 from .cache import CacheStore
+from .chunking import ChunkConfig
+from .dedup import dedup_notes
+from .extract import shutdown_parse_pool
+from .llm import configure_call_policy, configure_memo, configure_rate_limit
 from .log import get_logger, setup_logging
-from .pdf_export import markdown_to_pdf
-from .research import extract_notes, fetch_sources, search_serper
-from .writer import build_plan, critic_report, write_report
+from .output import ReportSink, write_report_files
+from .packing import pack_notes
+from .pipeline import run_research
+from .retry import CallPolicy
+from .trace import Tracer, build_manifest, use_tracer, write_chrome_trace, write_manifest
+from .writer import build_plan, critic_report, revise_report, write_report
 
 
 logger = get_logger(__name__)
 
 
-def parse_args():
-    p = argparse.ArgumentParser(description="Research + Structured Report Agent (v2)")
-    p.add_argument("--topic", required=True, help="Report topic")
+def build_parser(description: str = "Research + Structured Report Agent (v2)", require_topic: bool = True):
+    p = argparse.ArgumentParser(description=description)
+    p.add_argument("--topic", required=require_topic, help="Report topic")
     p.add_argument("--audience", default="Software engineers", help="Target audience")
     p.add_argument("--length", default="long", choices=["short", "medium", "long"], help="Report length")
     p.add_argument("--search", action="store_true", help="Enable Serper search")
@@ -28,7 +36,65 @@ def parse_args():
     p.add_argument("--outdir", default="outputs", help="Output directory")
     p.add_argument("--model", default="gpt-5", help="OpenAI model")
     p.add_argument("--no-cache", action="store_true", help="Disable caching")
-    return p.parse_args()
+    p.add_argument("--cache-backend", default="sqlite", choices=["sqlite", "file"], help="Cache storage backend")
+    p.add_argument("--no-stream", dest="stream", action="store_false", help="Wait for the full report before writing outputs")
+    p.add_argument("--search-workers", type=int, default=4, help="Concurrent Serper queries")
+    p.add_argument("--fetch-workers", type=int, default=8, help="Maximum concurrent page fetches")
+    p.add_argument("--per-host", type=int, default=2, help="Maximum concurrent fetches per host")
+    p.add_argument("--fetch-deadline", type=float, default=60.0, help="Deadline in seconds for the whole fetch stage (0 disables)")
+    p.add_argument("--max-page-bytes", type=int, default=5 * 1024 * 1024, help="Maximum bytes downloaded per page")
+    p.add_argument("--fetch-ttl", type=float, default=86400.0, help="Seconds before a cached page is revalidated with a conditional GET (0 never revalidates)")
+    p.add_argument("--extractor", default="fast", choices=["fast", "bs4"], help="HTML text extractor")
+    p.add_argument("--parse-processes", type=int, default=0, help="Process pool size for HTML extraction (0 parses in the fetch threads)")
+    p.add_argument("--max-source-chars", type=int, default=200000, help="Maximum extracted text kept per source")
+    p.add_argument("--chunk-chars", type=int, default=6000, help="Target chunk size for long-document note extraction")
+    p.add_argument("--chunk-overlap", type=int, default=600, help="Chars of overlap carried into each following chunk")
+    p.add_argument("--chunk-workers", type=int, default=4, help="Parallel chunk extractions per source")
+    p.add_argument("--source-token-budget", type=int, default=30000, help="Input token budget for chunk extraction per source (0 disables)")
+    p.add_argument("--source-max-cost", type=float, default=0.0, help="Per-source USD budget for chunk extraction (0 disables)")
+    p.add_argument("--usd-per-1k-tokens", type=float, default=0.0, help="Input price used with --source-max-cost")
+    p.add_argument("--notes-workers", type=int, default=4, help="Parallel note-extraction workers")
+    p.add_argument("--queue-size", type=int, default=4, help="Bounded queue size between search, fetch and notes stages")
+    p.add_argument("--section-workers", type=int, default=4, help="Parallel section rewrites in critic iterations")
+    p.add_argument("--dedup-threshold", type=float, default=0.5, help="Jaccard threshold for collapsing near-duplicate notes (0 disables)")
+    p.add_argument("--writer-token-budget", type=int, default=24000, help="Token budget for notes in writer prompts (0 disables)")
+    p.add_argument("--critic-token-budget", type=int, default=16000, help="Token budget for the report sent to the critic (0 disables)")
+    p.add_argument("--llm-rpm", type=float, default=0, help="LLM requests per minute limit (0 disables)")
+    p.add_argument("--llm-tpm", type=float, default=0, help="LLM tokens per minute limit (0 disables)")
+    p.add_argument("--llm-timeout", type=float, default=180.0, help="Seconds before a single LLM request is abandoned and retried (0 disables)")
+    p.add_argument("--llm-deadline", type=float, default=600.0, help="Seconds for an LLM call including retries (0 disables)")
+    p.add_argument(
+        "--llm-stage-deadline",
+        action="append",
+        type=_stage_deadline,
+        # Streaming the full report is the longest single call.
+        default=[("write", 1200.0)],
+        metavar="STAGE=SECONDS",
+        help="Per-stage LLM deadline overriding --llm-deadline (plan, notes, write, section, critic); repeatable",
+    )
+    p.add_argument("--llm-retries", type=int, default=3, help="Retries per LLM call for rate limits, 5xx, timeouts and connection errors")
+    p.add_argument("--llm-hedge", action="store_true", help="Send a duplicate LLM request when one runs past the stage's recent p95 latency")
+    p.add_argument("--llm-memo", type=int, default=256, help="In-process LRU of LLM responses, in entries (0 disables; off with --no-cache)")
+    p.add_argument("--log-payload-chars", type=int, default=2000, help="Cap on logged prompt/request payloads (0 logs them in full)")
+    p.add_argument("--log-payload-every", type=int, default=20, help="Log one payload in every N per kind (1 logs all, 0 none)")
+    p.add_argument("--debug-log", default="", help="Write every full LLM/notes payload to this file")
+    p.add_argument("--chrome-trace", default="", help="Also write spans as a Chrome trace (chrome://tracing, Perfetto) to this file")
+    io = p.add_mutually_exclusive_group()
+    io.add_argument("--record", default="", help="Record LLM, Serper and HTTP responses to this cassette file")
+    io.add_argument("--replay", default="", help="Serve LLM, Serper and HTTP responses from this cassette file (offline)")
+    return p
+
+
+def parse_args():
+    return build_parser().parse_args()
+
+
+def _stage_deadline(value: str):
+    stage, _, seconds = value.partition("=")
+    try:
+        return stage.strip(), float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected STAGE=SECONDS, got {value!r}") from None
 
 
 def _queries_from_plan(plan: str) -> List[str]:
@@ -52,84 +118,248 @@ def _queries_from_plan(plan: str) -> List[str]:
 
 def run() -> None:
     args = parse_args()
-    setup_logging()
-    load_dotenv()
+    init_process(args)
     logger.info("Starting report run topic=%r model=%s search=%s", args.topic, args.model, args.search)
-    if not os.getenv("OPENAI_API_KEY"):
-        raise SystemExit("Missing OPENAI_API_KEY. Put it in .env or environment.")
     outdir = Path(args.outdir)
     outdir.mkdir(parents=True, exist_ok=True)
-    cache = CacheStore(outdir=outdir, enabled=not args.no_cache)
+    cache = CacheStore(outdir=outdir, enabled=not args.no_cache, backend=args.cache_backend)
+    try:
+        with replay_layer(args):
+            run_job(args, outdir, cache)
+    finally:
+        shutdown_parse_pool()
+
+
+def init_process(args) -> None:
+    """
+    Process-wide setup shared by every report in the process: logging, `.env`,
+    and the LLM rate limiter, call policy and memo.
+    """
+    setup_logging(
+        payload_chars=args.log_payload_chars,
+        payload_every=args.log_payload_every,
+        debug_sink=Path(args.debug_log) if args.debug_log else None,
+    )
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if not args.replay and not os.getenv("OPENAI_API_KEY"):
+        raise SystemExit("Missing OPENAI_API_KEY. Put it in .env or environment.")
+    configure_rate_limit(requests_per_min=args.llm_rpm, tokens_per_min=args.llm_tpm)
+    configure_call_policy(
+        CallPolicy(
+            deadline_s=args.llm_deadline,
+            stage_deadlines=dict(args.llm_stage_deadline),
+            attempt_timeout_s=args.llm_timeout,
+            max_attempts=1 + max(0, args.llm_retries),
+            hedge=args.llm_hedge,
+        )
+    )
+    configure_memo(0 if args.no_cache else args.llm_memo)
+
 
+def run_job(args, outdir: Path, cache: CacheStore, tracer: Optional[Tracer] = None) -> dict:
+    """
+    Generate one report into `outdir` under its own tracer (a new one unless
+    given), so concurrent jobs in one process keep separate manifests. Returns
+    the run summary; the manifest is written for failed runs too.
+    """
+    tracer = tracer or Tracer()
+    summary = {"status": "failed"}
+    with use_tracer(tracer):
+        try:
+            summary = {"status": "ok", **_generate(args, outdir, cache)}
+        finally:
+            # Written for failed runs too, so a slow or crashed run can be diagnosed.
+            run_info = {"topic": args.topic, "model": args.model, **summary, "args": vars(args)}
+            write_manifest(outdir / "run_manifest.json", build_manifest(run_info, tracer.cache_stats()))
+            if args.chrome_trace:
+                write_chrome_trace(Path(args.chrome_trace))
+    return summary
+
+
+def replay_layer(args):
+    if not (args.record or args.replay):
+        return contextlib.nullcontext()
+    # Imported only when used: the replay layer pulls in `requests`.
+    from .replay import Cassette, Replay
+
+    if args.record:
+        return Replay(Cassette.load(Path(args.record)), mode="record")
+    path = Path(args.replay)
+    if not path.exists():
+        raise SystemExit(f"Cassette not found: {path}")
+    # Search goes through the cassette; the key is only checked, never sent.
+    os.environ.setdefault("SERPER_API_KEY", "replay")
+    return Replay(Cassette.load(path), mode="replay")
+
+
+def _generate(args, outdir: Path, cache: CacheStore) -> dict:
+    fetch_opts = {
+        "per_host": args.per_host,
+        "deadline_s": args.fetch_deadline or None,
+        "extractor": args.extractor,
+        "max_bytes": args.max_page_bytes,
+        "parse_processes": args.parse_processes,
+        "text_budget": args.max_source_chars,
+        "ttl_s": args.fetch_ttl,
+        "chunking": ChunkConfig(
+            target_chars=args.chunk_chars,
+            overlap_chars=args.chunk_overlap,
+            workers=args.chunk_workers,
+            token_budget=args.source_token_budget,
+            max_cost_usd=args.source_max_cost,
+            usd_per_1k_tokens=args.usd_per_1k_tokens,
+            dedup_threshold=args.dedup_threshold,
+        ),
+    }
     manual_urls = [u.strip() for u in args.urls.split(",") if u.strip()]
 
     plan = build_plan(topic=args.topic, audience=args.audience, length=args.length, model=args.model, cache=cache)
     logger.info("Plan ready")
 
-    all_urls = list(manual_urls)
-    if args.search:
-        queries = _queries_from_plan(plan)
+    queries = _queries_from_plan(plan) if args.search else []
+    if queries:
         logger.info("Running search for %d query(s)", len(queries))
-        found_urls = search_serper(queries=queries, max_sources=args.max_sources, cache=cache)
-        for u in found_urls:
-            if u not in all_urls:
-                all_urls.append(u)
-
-    all_urls = all_urls[: args.max_sources]
-    logger.info("Collecting up to %d source(s), selected=%d", args.max_sources, len(all_urls))
-    sources = fetch_sources(all_urls, cache=cache) if all_urls else []
-    notes = extract_notes(sources=sources, model=args.model, cache=cache) if sources else []
+    logger.info("Collecting up to %d source(s)", args.max_sources)
+    research = run_research(
+        manual_urls=manual_urls,
+        queries=queries,
+        max_sources=args.max_sources,
+        model=args.model,
+        cache=cache,
+        search_workers=args.search_workers,
+        fetch_workers=args.fetch_workers,
+        notes_workers=args.notes_workers,
+        queue_size=args.queue_size,
+        **fetch_opts,
+    )
+    sources, notes = research.sources, research.notes
     logger.info("Prepared %d source(s) and %d note(s)", len(sources), len(notes))
 
+    md_path = outdir / "report.md"
+    pdf_path = outdir / "report.pdf"
     report_md = ""
     review = None
+    reviewed_md = ""
+    notes_changed = True
+
+    dedup_stats = None
 
     for iteration in range(max(1, args.iterations)):
         logger.info("Writer/Critic iteration %d", iteration + 1)
-        report_md = write_report(
-            topic=args.topic,
-            audience=args.audience,
-            length=args.length,
-            plan=plan,
-            notes=notes,
-            model=args.model,
-        )
+        writer_notes = notes
+        if args.dedup_threshold > 0:
+            writer_notes, dedup_stats = dedup_notes(notes, threshold=args.dedup_threshold)
+        packing = pack_notes(writer_notes, plan=plan, budget_tokens=args.writer_token_budget)
+        writer_notes = packing.notes
+        dropped_path = outdir / "dropped_notes.json"
+        if packing.dropped:
+            dropped_path.write_text(
+                json.dumps([asdict(n) for n in packing.dropped], indent=2, ensure_ascii=False), encoding="utf-8"
+            )
+        else:
+            dropped_path.unlink(missing_ok=True)
+        revised = None
+        if review is not None and not notes_changed:
+            # Only the flagged sections are regenerated when the evidence is unchanged.
+            revised = revise_report(
+                topic=args.topic,
+                audience=args.audience,
+                report_markdown=report_md,
+                issues=review.issues,
+                notes=writer_notes,
+                model=args.model,
+                workers=args.section_workers,
+                cache=cache,
+            )
+        if revised is not None:
+            report_md = revised
+            if args.stream:
+                write_report_files(report_md, md_path, pdf_path)
+        else:
+            # Each draft is streamed into report.partial.md/.pdf and replaces report.md/.pdf once complete.
+            sink = ReportSink(md_path, pdf_path) if args.stream else None
+            try:
+                report_md = write_report(
+                    topic=args.topic,
+                    audience=args.audience,
+                    length=args.length,
+                    plan=plan,
+                    notes=writer_notes,
+                    model=args.model,
+                    on_line=sink,
+                    cache=cache,
+                    issues=review.issues if review is not None else None,
+                )
+                if sink is not None:
+                    sink.commit()
+            finally:
+                if sink is not None:
+                    sink.close()
+        notes_changed = False
+        if review is not None and report_md == reviewed_md:
+            # The critic's verdict on this exact draft is already known; another review cannot change it.
+            logger.info("Iteration %d produced an unchanged draft; stopping", iteration + 1)
+            break
+        reviewed_md = report_md
         review = critic_report(
             topic=args.topic,
             report_markdown=report_md,
             source_count=len(sources),
             model=args.model,
             cache=cache,
+            token_budget=args.critic_token_budget,
         )
         if review.passed:
             logger.info("Critic passed on iteration %d", iteration + 1)
             break
         if args.search and review.new_queries:
             logger.info("Critic requested %d additional query(s)", len(review.new_queries))
-            new_urls = search_serper(queries=review.new_queries, max_sources=args.max_sources, cache=cache)
-            for u in new_urls:
-                if len(all_urls) >= args.max_sources:
-                    break
-                if u not in all_urls:
-                    all_urls.append(u)
-            sources = fetch_sources(all_urls, cache=cache)
-            notes = extract_notes(sources=sources, model=args.model, cache=cache)
+            before = len(research.sources)
+            # Only new URLs are fetched and extracted; existing S# IDs stay as they are.
+            run_research(
+                manual_urls=[],
+                queries=review.new_queries,
+                max_sources=args.max_sources,
+                model=args.model,
+                cache=cache,
+                search_workers=args.search_workers,
+                fetch_workers=args.fetch_workers,
+                notes_workers=args.notes_workers,
+                queue_size=args.queue_size,
+                state=research,
+                **fetch_opts,
+            )
+            sources, notes = research.sources, research.notes
             logger.info("After enrichment: %d source(s), %d note(s)", len(sources), len(notes))
+            if len(sources) == before:
+                continue
+            notes_changed = True
 
-    md_path = outdir / "report.md"
-    pdf_path = outdir / "report.pdf"
-    md_path.write_text(report_md, encoding="utf-8")
-    markdown_to_pdf(report_md, pdf_path)
+    if not args.stream:
+        write_report_files(report_md, md_path, pdf_path)
     logger.info("Wrote output files")
 
     print(f"✅ Wrote {md_path}")
     print(f"✅ Wrote {pdf_path}")
+    if dedup_stats is not None and dedup_stats.notes_saved:
+        print(
+            f"Note dedup: {dedup_stats.notes_before} -> {dedup_stats.notes_after} note(s), "
+            f"{dedup_stats.chars_saved} prompt char(s) saved"
+        )
     if review:
         print(f"Critic pass: {review.passed}")
         if review.issues:
             print("Issues:")
             for issue in review.issues:
                 print(f"- {issue}")
+    return {
+        "sources": len(sources),
+        "notes": len(notes),
+        "critic_passed": review.passed if review else None,
+        "iterations": iteration + 1,
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+import random
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple
+
+from .log import get_logger
+from .models import Note
+from .trace import traced
+from .prompts import make_notes_block
+
+
+logger = get_logger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_CONFIDENCE_RANK = {"high": 2, "medium": 1, "low": 0}
+_PRIME = (1 << 61) - 1
+
+
+@dataclass
+class DedupStats:
+    notes_before: int
+    notes_after: int
+    chars_before: int
+    chars_after: int
+
+    @property
+    def notes_saved(self) -> int:
+        return self.notes_before - self.notes_after
+
+    @property
+    def chars_saved(self) -> int:
+        return self.chars_before - self.chars_after
+
+
+class MinHasher:
+    """
+    MinHash signatures over word shingles, with LSH banding to find candidate
+    pairs. Hash parameters come from a fixed seed so grouping (and therefore the
+    writer prompt and its cache key) is identical across runs.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle: int = 2, seed: int = 1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+
+    def shingles(self, text: str) -> Set[int]:
+        words = _WORD.findall(text.lower())
+        if len(words) < self.shingle:
+            return {zlib.crc32(" ".join(words).encode("utf-8"))}
+        return {
+            zlib.crc32(" ".join(words[i : i + self.shingle]).encode("utf-8"))
+            for i in range(len(words) - self.shingle + 1)
+        }
+
+    def signature(self, shingles: Set[int]) -> List[int]:
+        return [min((a * x + b) % _PRIME for x in shingles) for a, b in self.params]
+
+    def band_keys(self, signature: List[int]) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [(band, tuple(signature[band * self.rows : (band + 1) * self.rows])) for band in range(self.bands)]
+
+
+def _jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+@traced("dedup")
+def dedup_notes(notes: List[Note], threshold: float = 0.5) -> Tuple[List[Note], DedupStats]:
+    """The writer-stage "dedup" span around `collapse_duplicates`."""
+    return collapse_duplicates(notes, threshold)
+
+
+def collapse_duplicates(notes: List[Note], threshold: float = 0.5) -> Tuple[List[Note], DedupStats]:
+    """
+    Collapse near-duplicate claims. Each group keeps its highest-confidence note
+    (longest support breaks ties), takes the union of tags, and carries the other
+    members' source IDs as extra citations. Group order follows first appearance.
+    """
+    hasher = MinHasher()
+    shingles = [hasher.shingles(n.claim) for n in notes]
+    parent = list(range(len(notes)))
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+    for i, sh in enumerate(shingles):
+        for band_key in hasher.band_keys(hasher.signature(sh)):
+            buckets.setdefault(band_key, []).append(i)
+    checked = set()
+    for members in buckets.values():
+        for pos, i in enumerate(members):
+            for j in members[pos + 1 :]:
+                if (i, j) in checked:
+                    continue
+                checked.add((i, j))
+                if _jaccard(shingles[i], shingles[j]) >= threshold:
+                    parent[_find(parent, j)] = _find(parent, i)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(notes)):
+        groups.setdefault(_find(parent, i), []).append(i)
+
+    result: List[Note] = []
+    for members in sorted(groups.values(), key=lambda m: m[0]):
+        best = max(
+            members,
+            key=lambda i: (_CONFIDENCE_RANK.get(notes[i].confidence, 0), len(notes[i].support), -i),
+        )
+        rep = notes[best]
+        cited = [rep.source_id, *rep.merged_source_ids]
+        tags = list(rep.tags)
+        for i in members:
+            for sid in [notes[i].source_id, *notes[i].merged_source_ids]:
+                if sid not in cited:
+                    cited.append(sid)
+            tags.extend(t for t in notes[i].tags if t not in tags)
+        result.append(
+            Note(
+                claim=rep.claim,
+                support=rep.support,
+                tags=tags,
+                confidence=rep.confidence,
+                source_id=rep.source_id,
+                url=rep.url,
+                merged_source_ids=cited[1:],
+            )
+        )
+
+    stats = DedupStats(
+        notes_before=len(notes),
+        notes_after=len(result),
+        chars_before=len(make_notes_block(notes)),
+        chars_after=len(make_notes_block(result)),
+    )
+    logger.info(
+        "Note dedup: %d -> %d note(s), %d prompt char(s) saved",
+        stats.notes_before,
+        stats.notes_after,
+        stats.chars_saved,
+    )
+    return result, stats
@@ -0,0 +1,147 @@
+import re
+import threading
+from html.parser import HTMLParser
+from typing import TYPE_CHECKING, Callable, Dict, Tuple
+
+from .log import get_logger
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+
+logger = get_logger(__name__)
+
+TEXT_BUDGET = 12000
+FEED_CHUNK = 64 * 1024
+
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def _clean_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def bs4_extract(html: str, url: str, budget: int = TEXT_BUDGET) -> Tuple[str, str]:
+    """Reference path: full BeautifulSoup tree, then truncate."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else url
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    text = _clean_text(soup.get_text(" ", strip=True))[:budget]
+    return title, text
+
+
+class _TextCollector(HTMLParser):
+    # Non-content and boilerplate containers whose text is dropped.
+    SKIP = {"script", "style", "noscript", "template", "svg", "iframe", "nav", "footer", "aside"}
+
+    def __init__(self, budget: int):
+        super().__init__(convert_charrefs=True)
+        self.budget = budget
+        self.parts = []
+        self.size = 0
+        self.title_parts = []
+        self.in_title = False
+        self.skip_depth = 0
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skip_depth += 1
+        elif tag == "title":
+            self.in_title = True
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self.skip_depth:
+            self.skip_depth -= 1
+        elif tag == "title":
+            self.in_title = False
+
+    def handle_data(self, data):
+        if self.in_title:
+            self.title_parts.append(data)
+            return
+        if self.skip_depth or self.done:
+            return
+        chunk = _clean_text(data)
+        if not chunk:
+            return
+        self.parts.append(chunk)
+        self.size += len(chunk) + 1
+        if self.size >= self.budget:
+            self.done = True
+
+
+def fast_extract(html: str, url: str, budget: int = TEXT_BUDGET) -> Tuple[str, str]:
+    """
+    Streaming path: feeds the document in chunks and stops as soon as `budget`
+    characters of visible text are collected, skipping scripts and nav/footer/aside.
+    """
+    parser = _TextCollector(budget)
+    for start in range(0, len(html), FEED_CHUNK):
+        parser.feed(html[start : start + FEED_CHUNK])
+        if parser.done:
+            break
+    title = _clean_text("".join(parser.title_parts)) or url
+    return title, " ".join(parser.parts)[:budget]
+
+
+EXTRACTORS: Dict[str, Callable[[str, str, int], Tuple[str, str]]] = {
+    "fast": fast_extract,
+    "bs4": bs4_extract,
+}
+
+
+def get_extractor(name: str) -> Callable[[str, str, int], Tuple[str, str]]:
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown extractor {name!r}; expected one of {sorted(EXTRACTORS)}")
+    return EXTRACTORS[name]
+
+
+def _run_extractor(name: str, html: str, url: str, budget: int) -> Tuple[str, str]:
+    return EXTRACTORS[name](html, url, budget)
+
+
+def submit_parse(processes: int, fn: Callable, *args) -> "Future":
+    """
+    Submit `fn(*args)` to the shared parse pool, rebuilding it when a caller asks
+    for a different size. The lock is held across the submit, so no thread can
+    submit to a pool that another thread has just shut down.
+    """
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is not None and _pool_size != processes:
+            logger.info("Resizing parse pool %d -> %d process(es)", _pool_size, processes)
+            # Work already submitted to the old pool still completes.
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            _pool = ProcessPoolExecutor(max_workers=processes)
+            _pool_size = processes
+        return _pool.submit(fn, *args)
+
+
+def extract(html: str, url: str, name: str = "fast", budget: int = TEXT_BUDGET, processes: int = 0) -> Tuple[str, str]:
+    """
+    Extract (title, text). With `processes > 0` the work runs in a shared process
+    pool, so pages parsed from several fetch threads use several cores.
+    """
+    get_extractor(name)
+    if processes > 0:
+        return submit_parse(processes, _run_extractor, name, html, url, budget).result()
+    return _run_extractor(name, html, url, budget)
+
+
+def shutdown_parse_pool(wait: bool = True) -> None:
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait)
+            _pool = None
+            _pool_size = 0
@@ -0,0 +1,211 @@
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .log import get_logger
+
+if TYPE_CHECKING:
+    import requests
+
+_session = None
+_pool_maxsize = 8
+_session_lock = threading.Lock()
+_host_limits: Dict[str, threading.BoundedSemaphore] = {}
+_host_lock = threading.Lock()
+logger = get_logger(__name__)
+
+
+def configure_session(pool_maxsize: int) -> None:
+    """
+    Raise the connection pool size used when the shared session is created.
+    It only grows, so a batch sized for several concurrent jobs is not shrunk
+    by one job's fetch stage.
+    """
+    global _pool_maxsize
+    _pool_maxsize = max(_pool_maxsize, pool_maxsize)
+
+
+def get_session(pool_maxsize: Optional[int] = None) -> "requests.Session":
+    """
+    Shared keep-alive session. Connections are pooled per host by the adapter,
+    so repeated fetches against the same site reuse sockets. `requests` is
+    imported here, on the first network call, so cache-only runs never load it.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                pool_maxsize = pool_maxsize or _pool_maxsize
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_maxsize)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update({"User-Agent": "Mozilla/5.0"})
+                _session = session
+                logger.debug("HTTP session created pool_maxsize=%d", pool_maxsize)
+    return _session
+
+
+def set_session(session) -> None:
+    """Replace the shared session (e.g. with a record/replay stand-in from `replay.py`)."""
+    global _session
+    with _session_lock:
+        _session = session
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def host_limit(url: str, per_host: int) -> threading.BoundedSemaphore:
+    host = host_of(url)
+    with _host_lock:
+        sem = _host_limits.get(host)
+        if sem is None:
+            sem = threading.BoundedSemaphore(max(1, per_host))
+            _host_limits[host] = sem
+        return sem
+
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+SNIFF_BYTES = 4096
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([A-Za-z0-9_:.-]+)""", re.IGNORECASE)
+
+
+class UnsupportedContent(Exception):
+    """Raised when a response is not a text/HTML document and was not downloaded."""
+
+
+@dataclass
+class Download:
+    text: str
+    content_type: str
+    bytes_read: int
+    truncated: bool
+    status: int = 200
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    cache_control: Optional[str] = None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+
+def parse_cache_control(header: Optional[str]) -> Dict[str, Optional[str]]:
+    directives: Dict[str, Optional[str]] = {}
+    for part in (header or "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+def freshness_lifetime(cache_control: Optional[str], ttl_s: float) -> float:
+    """
+    Seconds a stored page may be used without revalidation: `ttl_s`, shortened
+    by the server's `max-age`, and zero for `no-cache`/`no-store`.
+    """
+    directives = parse_cache_control(cache_control)
+    if "no-cache" in directives or "no-store" in directives:
+        return 0.0
+    try:
+        return min(ttl_s, float(directives["max-age"]))
+    except (KeyError, TypeError, ValueError):
+        return ttl_s
+
+
+def is_fresh(fetched_at: Optional[float], cache_control: Optional[str], ttl_s: float) -> bool:
+    """`ttl_s <= 0` disables revalidation: stored pages are always fresh."""
+    if ttl_s <= 0:
+        return True
+    if fetched_at is None:
+        return False
+    return time.time() - fetched_at < freshness_lifetime(cache_control, ttl_s)
+
+
+def conditional_headers(etag: Optional[str], last_modified: Optional[str]) -> Dict[str, str]:
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def _split_content_type(header: str) -> Tuple[str, Optional[str]]:
+    parts = [p.strip() for p in (header or "").split(";")]
+    charset = None
+    for part in parts[1:]:
+        if part.lower().startswith("charset="):
+            charset = part.split("=", 1)[1].strip("\"' ")
+    return parts[0].lower(), charset
+
+
+def sniff_charset(head: bytes) -> str:
+    """Pick an encoding from the first few KB only: BOM, <meta charset>, then UTF-8 validity."""
+    if head.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    match = _META_CHARSET.search(head[:SNIFF_BYTES])
+    if match:
+        return match.group(1).decode("ascii", "ignore")
+    try:
+        # Cut at the last space so a multi-byte character split by the window does not count.
+        head[:SNIFF_BYTES].rsplit(b" ", 1)[0].decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def download_text(
+    url: str,
+    timeout: float,
+    max_bytes: int,
+    headers: Optional[Dict[str, str]] = None,
+    deadline: Optional[float] = None,
+) -> Download:
+    """
+    Stream a GET response, aborting before the body is read when the content type
+    is not HTML/text, and stopping after `max_bytes` (reported as truncated).
+    With conditional `headers` a `304 Not Modified` returns an empty Download
+    whose `not_modified` is set. Validators and Cache-Control are returned too.
+    `timeout` bounds each socket read only; a `deadline` (`time.monotonic()`)
+    also stops a server that keeps trickling bytes, raising TimeoutError.
+    """
+    with get_session().get(url, timeout=timeout, stream=True, headers=headers) as r:
+        r.raise_for_status()
+        meta = {
+            "status": r.status_code,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "cache_control": r.headers.get("Cache-Control"),
+        }
+        if r.status_code == 304:
+            return Download(text="", content_type="", bytes_read=0, truncated=False, **meta)
+        content_type, charset = _split_content_type(r.headers.get("Content-Type", ""))
+        if content_type and not content_type.startswith(HTML_CONTENT_TYPES):
+            raise UnsupportedContent(f"content-type {content_type}")
+        chunks = []
+        size = 0
+        truncated = False
+        for chunk in r.iter_content(chunk_size=64 * 1024):
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError("fetch stage deadline exceeded")
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > max_bytes:
+                truncated = True
+                break
+    body = b"".join(chunks)[:max_bytes]
+    encoding = charset or sniff_charset(body[:SNIFF_BYTES])
+    try:
+        text = body.decode(encoding, errors="replace")
+    except LookupError:
+        text = body.decode("utf-8", errors="replace")
+    return Download(text=text, content_type=content_type, bytes_read=len(body), truncated=truncated, **meta)
@@ -0,0 +1,23 @@
+import hashlib
+
+from .prompts import PROMPTS_VERSION
+
+
+def content_hash(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8")
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") never collide.
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def llm_key(stage: str, model: str, system: str, user: str, version: str = PROMPTS_VERSION) -> str:
+    """
+    Cache key for one LLM call: the exact model, system prompt and user payload,
+    plus the prompt-template version. Any change to a prompt template changes the
+    rendered payload and therefore the key; bump PROMPTS_VERSION in prompts.py
+    when the meaning of cached output changes without the text changing.
+    """
+    return f"{stage}::{model}::v{version}::{content_hash(model, system, user)}"
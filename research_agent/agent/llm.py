@@ -1,21 +1,289 @@
+import itertools
 import json
-from openai import OpenAI
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Optional
 
-from .log import get_logger
+from .cache import MemoryLRU
+from .keys import content_hash
+from .log import get_logger, log_payload
+from .ratelimit import RateLimiter, estimate_tokens
+from .retry import FATAL, CallPolicy, CallStats, LatencyWindow, LLMTimeout, backoff_s, classify_error, retry_after_s
+from .singleflight import SingleFlight
+from .trace import annotate, bind, get_tracer
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 _client = None
+_limiter = RateLimiter()
+_policy = CallPolicy()
+_stats = CallStats()
+_latency: Dict[str, LatencyWindow] = {}
+_latency_lock = threading.Lock()
+_inflight = SingleFlight()
+_memo = MemoryLRU(max_entries=256)
 logger = get_logger(__name__)
 
 
-def get_client() -> OpenAI:
+def get_client() -> "OpenAI":
+    """The `openai` package is imported on the first uncached LLM call."""
     global _client
     if _client is None:
-        _client = OpenAI()
+        from openai import OpenAI
+
+        # Retries are handled here (see `_call`), not inside the client.
+        _client = OpenAI(max_retries=0)
     return _client
 
 
-def llm_text(model: str, system: str, user: str) -> str:
+def set_client(client) -> None:
+    """Replace the shared client (e.g. with a record/replay stand-in from `replay.py`)."""
+    global _client
+    _client = client
+
+
+def configure_rate_limit(requests_per_min: float = 0, tokens_per_min: float = 0) -> RateLimiter:
+    """Replace the limiter shared by all LLM calls. Zero disables the corresponding limit."""
+    global _limiter
+    _limiter = RateLimiter(requests_per_min=requests_per_min, tokens_per_min=tokens_per_min)
+    logger.info("LLM rate limit rpm=%s tpm=%s", requests_per_min or "off", tokens_per_min or "off")
+    return _limiter
+
+
+def get_rate_limiter() -> RateLimiter:
+    return _limiter
+
+
+def configure_call_policy(policy: CallPolicy) -> CallPolicy:
+    """Replace the deadline/retry/hedging policy used by all LLM calls."""
+    global _policy
+    _policy = policy
+    logger.info(
+        "LLM call policy deadline=%s attempt_timeout=%s attempts=%d hedge=%s",
+        policy.deadline_s or "off",
+        policy.attempt_timeout_s or "off",
+        policy.max_attempts,
+        f"p{policy.hedge_quantile * 100:g}" if policy.hedge else "off",
+    )
+    return _policy
+
+
+def get_call_policy() -> CallPolicy:
+    return _policy
+
+
+def configure_memo(max_entries: int = 256) -> None:
+    """
+    Replace the in-process LRU of LLM responses (0 disables it). It answers
+    repeated prompts within the process before they reach the network, also
+    when the persistent `CacheStore` is disabled or another store holds them.
+    """
+    global _memo
+    _memo = MemoryLRU(max_entries=max_entries)
+
+
+def get_llm_stats() -> Dict[str, int]:
+    """
+    Process-wide counters since start-up: calls, attempts, retries (also per
+    error class), timeouts, failures, hedges, hedge_wins, memo_hits and
+    coalesced (callers that joined an identical in-flight request). Except for calls,
+    the counts for the current run are also tracer counters (`llm.*` in the
+    manifest).
+    """
+    return _stats.snapshot()
+
+
+def _count(name: str, value: int = 1) -> None:
+    _stats.add(name, value)
+    get_tracer().add(f"llm.{name}", value)
+
+
+def _latency_window(stage: str) -> LatencyWindow:
+    with _latency_lock:
+        window = _latency.get(stage)
+        if window is None:
+            window = _latency[stage] = LatencyWindow()
+        return window
+
+
+def _remaining(expires: Optional[float]) -> Optional[float]:
+    return None if expires is None else expires - time.monotonic()
+
+
+def _check_deadline(expires: Optional[float]) -> None:
+    if expires is not None and time.monotonic() >= expires:
+        raise LLMTimeout("LLM call deadline exceeded")
+
+
+def _request(payload: dict, policy: CallPolicy) -> dict:
+    if policy.attempt_timeout_s > 0:
+        return {**payload, "timeout": policy.attempt_timeout_s}
+    return payload
+
+
+def _in_thread(fn: Callable[[], object]) -> Future:
+    """
+    Run `fn` on a daemon thread. A request abandoned at its deadline or lost to
+    a hedge keeps running there until the client gives up, without blocking exit.
+    """
+    future: Future = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=bind(run), name="llm-attempt", daemon=True).start()
+    return future
+
+
+def _call(stage: str, policy: CallPolicy, expires: Optional[float], attempt_fn: Callable[[], object]):
+    """Run `attempt_fn` until it succeeds, the error is not retryable, attempts run out or the deadline passes."""
+    for attempt in itertools.count(1):
+        _count("attempts")
+        try:
+            result = attempt_fn()
+        except Exception as e:
+            kind = classify_error(e)
+            if isinstance(e, LLMTimeout):
+                _count("timeouts")
+            remaining = _remaining(expires)
+            delay = 0.0 if kind == FATAL else backoff_s(kind, attempt, policy, retry_after_s(e))
+            if kind == FATAL or attempt >= policy.max_attempts or (remaining is not None and delay >= remaining):
+                _count("failures")
+                annotate(attempts=attempt, error_class=kind)
+                raise
+            _count("retries")
+            _count(f"retries.{kind}")
+            logger.warning(
+                "LLM %s attempt %d/%d failed (%s: %s); retrying in %.2fs",
+                stage,
+                attempt,
+                policy.max_attempts,
+                kind,
+                e,
+                delay,
+            )
+            time.sleep(delay)
+            continue
+        if attempt > 1:
+            annotate(attempts=attempt)
+        return result
+
+
+def _attempt(stage: str, payload: dict, estimated: int, policy: CallPolicy, expires: Optional[float]):
+    """
+    One attempt of a non-streamed call. Without a time limit or hedging it runs
+    on the calling thread; otherwise the request runs on a worker thread and is
+    abandoned at its attempt timeout or the call deadline, and (with hedging) a
+    duplicate is sent once it is slower than the stage's recent p95.
+    """
     client = get_client()
+    request = _request(payload, policy)
+    window = _latency_window(stage)
+    limiter = _limiter
+    limiter.acquire(estimated)
+    started = time.monotonic()
+    if expires is None and policy.attempt_timeout_s <= 0 and not policy.hedge:
+        try:
+            resp = client.responses.create(**request)
+        except BaseException:
+            # The caller only settles a returned response; a failed request is refunded here.
+            limiter.settle(estimated, 0)
+            raise
+        window.add(time.monotonic() - started)
+        return resp
+
+    give_up = expires
+    if policy.attempt_timeout_s > 0:
+        give_up = min(give_up or float("inf"), started + policy.attempt_timeout_s)
+    hedge_after = window.quantile(policy.hedge_quantile, policy.hedge_min_samples) if policy.hedge else None
+    hedge_at = started + hedge_after if hedge_after is not None else None
+    starts = {_in_thread(lambda: client.responses.create(**request)): started}
+    pending = set(starts)
+    error: Optional[BaseException] = None
+    winner: Optional[Future] = None
+    try:
+        while pending:
+            limits = [t for t in (give_up, hedge_at) if t is not None]
+            timeout = max(0.0, min(limits) - time.monotonic()) if limits else None
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                window.add(time.monotonic() - starts[future])
+                if len(starts) > 1:
+                    hedge_won = future is not next(iter(starts))
+                    annotate(hedged=True, hedge_won=hedge_won)
+                    if hedge_won:
+                        _count("hedge_wins")
+                winner = future
+                return future.result()
+            if not pending:
+                break
+            now = time.monotonic()
+            if hedge_at is not None and now >= hedge_at:
+                hedge_at = None
+                if give_up is None or now < give_up:
+                    _count("hedges")
+                    logger.info(
+                        "LLM %s call slower than p%g (%.2fs); sending hedge request",
+                        stage,
+                        policy.hedge_quantile * 100,
+                        hedge_after,
+                    )
+                    limiter.acquire(estimated)
+                    hedge = _in_thread(lambda: client.responses.create(**request))
+                    starts[hedge] = time.monotonic()
+                    pending.add(hedge)
+                    continue
+            if give_up is not None and now >= give_up:
+                if expires is not None and now >= expires:
+                    raise LLMTimeout(f"LLM {stage} call deadline exceeded")
+                raise LLMTimeout(f"LLM {stage} attempt timed out after {now - started:.1f}s")
+        raise error
+    finally:
+        # Only the returned response is settled by the caller; every other request sent
+        # (a losing hedge, an abandoned attempt) settles its own reservation when it ends.
+        for future in starts:
+            if future is not winner:
+                future.add_done_callback(lambda f: limiter.settle(estimated, _future_usage(f)))
+
+
+def _future_usage(future: Future) -> Optional[int]:
+    """Tokens a finished request used (None when not reported); a failed one is refunded in full."""
+    if future.cancelled() or future.exception() is not None:
+        return 0
+    return _usage_tokens(future.result())
+
+
+def _usage_tokens(resp) -> Optional[int]:
+    usage = getattr(resp, "usage", None)
+    total = getattr(usage, "total_tokens", None)
+    return int(total) if total is not None else None
+
+
+def _record_usage(span, resp) -> None:
+    usage = getattr(resp, "usage", None)
+    tokens = {
+        "input_tokens": getattr(usage, "input_tokens", None),
+        "output_tokens": getattr(usage, "output_tokens", None),
+    }
+    tokens = {k: int(v) for k, v in tokens.items() if v is not None}
+    span.set(**tokens)
+    tracer = get_tracer()
+    tracer.add("llm.calls")
+    for name, value in tokens.items():
+        tracer.add(f"llm.{name}", value)
+
+
+def _request_text(model: str, system: str, user: str, stage: str) -> str:
     request_payload = {
         "model": model,
         "input": [
@@ -24,17 +292,150 @@ def llm_text(model: str, system: str, user: str) -> str:
         ],
     }
     logger.info("LLM text request model=%s", model)
-    logger.info("LLM request payload=%s", request_payload)
-    resp = client.responses.create(**request_payload)
+    log_payload(logger, "LLM request payload", request_payload)
+    policy = _policy
+    deadline_s = policy.deadline_for(stage)
+    expires = time.monotonic() + deadline_s if deadline_s > 0 else None
+    estimated = estimate_tokens(system, user)
+    _stats.add("calls")
+    with get_tracer().span("llm", model=model) as span:
+        resp = _call(stage, policy, expires, lambda: _attempt(stage, request_payload, estimated, policy, expires))
+        _record_usage(span, resp)
+    _limiter.settle(estimated, _usage_tokens(resp))
     return resp.output_text
 
 
-def llm_json(model: str, system: str, user: str) -> dict:
-    logger.info("LLM JSON request model=%s", model)
-    text = llm_text(model=model, system=system, user=user)
+def _memo_get(key: str) -> Optional[str]:
+    item = _memo.get("llm", key)
+    if item is None:
+        return None
+    _count("memo_hits")
+    return item[1]
+
+
+def _fill_memo(key: str, fn: Callable[[], str]) -> Callable[[], str]:
+    def run() -> str:
+        text = fn()
+        _memo.set("llm", key, time.time(), text)
+        return text
+
+    return run
+
+
+def llm_text(model: str, system: str, user: str) -> str:
+    """
+    One LLM response. Identical prompts (same model, system and user text) are
+    answered from the in-process memo, and concurrent identical calls share a
+    single request: later callers wait for the first one's result or error.
+    """
+    key = content_hash(model, system, user)
+    text = _memo_get(key)
+    if text is not None:
+        return text
+    stage = get_tracer().current() or "other"
+    text, shared = _inflight.do(key, _fill_memo(key, lambda: _request_text(model, system, user, stage)))
+    if shared:
+        _count("coalesced")
+    return text
+
+
+async def allm_text(model: str, system: str, user: str) -> str:
+    """`llm_text` for asyncio callers; the request runs in the loop's default executor."""
+    key = content_hash(model, system, user)
+    text = _memo_get(key)
+    if text is not None:
+        return text
+    stage = get_tracer().current() or "other"
+    request = bind(lambda: _request_text(model, system, user, stage))
+    text, shared = await _inflight.do_async(key, _fill_memo(key, request))
+    if shared:
+        _count("coalesced")
+    return text
+
+
+def _open_stream(payload: dict, estimated: int, policy: CallPolicy, expires: Optional[float]) -> Iterator:
+    """
+    Start a streamed response and read up to its first text delta, so failures
+    before any output reaches the caller can still be retried.
+    """
+    _limiter.acquire(estimated)
+    try:
+        events = iter(get_client().responses.create(**_request(payload, policy)))
+        head = []
+        for event in events:
+            _check_deadline(expires)
+            head.append(event)
+            if getattr(event, "type", "") == "response.output_text.delta":
+                break
+    except BaseException:
+        # A retried attempt reserves again, so this one's reservation is refunded.
+        _limiter.settle(estimated, 0)
+        raise
+    return itertools.chain(head, events)
+
+
+def llm_text_stream(model: str, system: str, user: str) -> Iterator[str]:
+    """
+    Like `llm_text`, but yields output text deltas as the model produces them.
+    Retries only happen before the first delta; the deadline is checked between
+    events. Streams are never hedged or coalesced, but a memoized response is
+    yielded at once and a completed stream fills the memo.
+    """
+    key = content_hash(model, system, user)
+    text = _memo_get(key)
+    if text is not None:
+        yield text
+        return
+    request_payload = {
+        "model": model,
+        "input": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ],
+        "stream": True,
+    }
+    logger.info("LLM stream request model=%s", model)
+    log_payload(logger, "LLM request payload", request_payload)
+    policy = _policy
+    stage = get_tracer().current() or "other"
+    deadline_s = policy.deadline_for(stage)
+    started = time.perf_counter()
+    expires = time.monotonic() + deadline_s if deadline_s > 0 else None
+    estimated = estimate_tokens(system, user)
+    usage_tokens = None
+    parts = []
+    _stats.add("calls")
+    with get_tracer().span("llm", model=model, stream=True) as span:
+        events = _call(stage, policy, expires, lambda: _open_stream(request_payload, estimated, policy, expires))
+        for event in events:
+            _check_deadline(expires)
+            kind = getattr(event, "type", "")
+            if kind == "response.output_text.delta":
+                if "first_token_s" not in span.attrs:
+                    span.set(first_token_s=round(time.perf_counter() - started, 4))
+                parts.append(event.delta)
+                yield event.delta
+            elif kind == "response.completed":
+                usage_tokens = _usage_tokens(event.response)
+                _record_usage(span, event.response)
+    _limiter.settle(estimated, usage_tokens)
+    _memo.set("llm", key, time.time(), "".join(parts))
+
+
+def _parse_json(text: str) -> dict:
     try:
         return json.loads(text)
     except json.JSONDecodeError:
         # Best-effort fallback for markdown fenced JSON
         cleaned = text.strip().removeprefix("```json").removeprefix("```").removesuffix("```").strip()
         return json.loads(cleaned)
+
+
+def llm_json(model: str, system: str, user: str) -> dict:
+    logger.info("LLM JSON request model=%s", model)
+    return _parse_json(llm_text(model=model, system=system, user=user))
+
+
+async def allm_json(model: str, system: str, user: str) -> dict:
+    logger.info("LLM JSON request model=%s", model)
+    return _parse_json(await allm_text(model=model, system=system, user=user))
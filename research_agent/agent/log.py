@@ -1,22 +1,129 @@
+import atexit
+import hashlib
+import itertools
 import logging
+import logging.handlers
+import queue
 import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
 
 
 LOG_FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+PAYLOAD_LOGGER = "agent.payloads"
 _CONFIGURED = False
+_listener: Optional[logging.handlers.QueueListener] = None
+_payload_chars = 2000
+_payload_every = 20
+_debug_sink = False
+_payload_counts: Dict[str, Iterator[int]] = {}
 
 
-def setup_logging(level: str = "INFO") -> None:
-    global _CONFIGURED
+class Payload:
+    """
+    Log argument for large values. It is only rendered when the record is
+    formatted (on the logging thread), and values longer than `limit` chars
+    are cut and tagged with their full length and a short SHA-256.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else str(self.value)
+        if self.limit <= 0 or len(text) <= self.limit:
+            return text
+        digest = hashlib.sha256(text.encode("utf-8", "replace")).hexdigest()[:12]
+        return f"{text[: self.limit]}... [truncated {len(text)} chars sha256={digest}]"
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener runs in this process, so the record is queued unformatted and
+        # message formatting (including Payload rendering) happens off the caller's thread.
+        return record
+
+
+class _PayloadFilter(logging.Filter):
+    def __init__(self, payloads: bool):
+        super().__init__()
+        self.payloads = payloads
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return (record.name == PAYLOAD_LOGGER) == self.payloads
+
+
+def setup_logging(
+    level: str = "INFO",
+    payload_chars: int = 2000,
+    payload_every: int = 20,
+    debug_sink: Optional[Path] = None,
+) -> None:
+    """
+    Route all records through a queue to a background thread that writes them
+    to stdout, so callers never block on output. Payload logs (`log_payload`)
+    are capped at `payload_chars` and only one in `payload_every` is logged;
+    with `debug_sink` every full payload is also written to that file.
+    """
+    global _CONFIGURED, _listener, _payload_chars, _payload_every, _debug_sink
     if _CONFIGURED:
         return
-    logging.basicConfig(
-        level=getattr(logging, level.upper(), logging.INFO),
-        format=LOG_FORMAT,
-        stream=sys.stdout,
-    )
+    _payload_chars = payload_chars
+    _payload_every = payload_every
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+    console.addFilter(_PayloadFilter(payloads=False))
+    handlers = [console]
+    if debug_sink is not None:
+        Path(debug_sink).parent.mkdir(parents=True, exist_ok=True)
+        sink = logging.FileHandler(debug_sink, encoding="utf-8")
+        sink.setFormatter(logging.Formatter("%(asctime)s | %(threadName)s | %(message)s"))
+        sink.addFilter(_PayloadFilter(payloads=True))
+        handlers.append(sink)
+        payload_logger = logging.getLogger(PAYLOAD_LOGGER)
+        payload_logger.setLevel(logging.DEBUG)
+        _debug_sink = True
+
+    log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers = [_DeferredQueueHandler(log_queue)]
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers)
+    _listener.start()
+    # Drain queued records before the interpreter exits.
+    atexit.register(shutdown_logging)
     _CONFIGURED = True
 
 
+def shutdown_logging() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def log_payload(logger: logging.Logger, label: str, value: Any) -> None:
+    """
+    Log a potentially large payload (prompts, request bodies): a capped preview
+    for the first and then every `payload_every`-th call per label, and the full
+    value in the debug sink when one is configured.
+    """
+    if _debug_sink:
+        logging.getLogger(PAYLOAD_LOGGER).debug("%s | %s=%s", logger.name, label, Payload(value, 0))
+    if _payload_every <= 0 or not logger.isEnabledFor(logging.INFO):
+        return
+    counter = _payload_counts.get(label)
+    if counter is None:
+        counter = _payload_counts.setdefault(label, itertools.count())
+    if next(counter) % _payload_every == 0:
+        logger.info("%s=%s", label, Payload(value, _payload_chars))
+
+
 def get_logger(name: str) -> logging.Logger:
     return logging.getLogger(name)
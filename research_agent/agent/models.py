@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Optional
 
 
@@ -10,6 +10,8 @@ class Source:
     text: str
     retrieved_at: str
     published_date: Optional[str] = None
+    # ok | truncated (body hit the byte cap) | skipped (non-HTML content) | failed
+    status: str = "ok"
 
 
 @dataclass
@@ -20,6 +22,12 @@ class Note:
     confidence: str
     source_id: str
     url: str
+    # Other sources whose near-duplicate notes were collapsed into this one.
+    merged_source_ids: List[str] = field(default_factory=list)
+
+    @property
+    def citations(self) -> str:
+        return "".join(f"[{sid}]" for sid in [self.source_id, *self.merged_source_ids])
 
 
 @dataclass
@@ -27,3 +35,9 @@ class CriticResult:
     passed: bool
     issues: List[str]
     new_queries: List[str]
+
+
+@dataclass
+class Section:
+    title: str
+    body: str
@@ -0,0 +1,73 @@
+import os
+from pathlib import Path
+
+from .log import get_logger
+from .pdf_export import PdfRenderer, markdown_to_pdf
+
+
+logger = get_logger(__name__)
+
+
+def partial_path(path: Path) -> Path:
+    """Where a draft of `path` is written before it replaces the finished file (report.partial.md)."""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.partial{path.suffix}")
+
+
+def write_report_files(report_md: str, md_path: Path, pdf_path: Path) -> None:
+    """Write report.md and report.pdf; each replaces the previous version only once complete."""
+    md_tmp, pdf_tmp = partial_path(md_path), partial_path(pdf_path)
+    md_tmp.write_text(report_md, encoding="utf-8")
+    markdown_to_pdf(report_md, pdf_tmp)
+    os.replace(md_tmp, md_path)
+    os.replace(pdf_tmp, pdf_path)
+
+
+class ReportSink:
+    """
+    Receives completed report lines while the writer is still generating: each
+    line is appended to report.partial.md and rendered into report.partial.pdf
+    right away. `commit()` moves the drafts over report.md/report.pdf, so a
+    draft that fails midway never replaces the previous complete report.
+    """
+
+    def __init__(self, md_path: Path, pdf_path: Path):
+        self.md_path = Path(md_path)
+        self.pdf_path = Path(pdf_path)
+        self.md_path.parent.mkdir(parents=True, exist_ok=True)
+        self.partial_md = partial_path(self.md_path)
+        self.partial_pdf = partial_path(self.pdf_path)
+        self._md = self.partial_md.open("w", encoding="utf-8")
+        self._pdf = PdfRenderer(self.partial_pdf)
+        self._closed = False
+        self.lines = 0
+
+    def __call__(self, line: str) -> None:
+        if self.lines == 0:
+            logger.info("First report line received")
+        self._md.write(line + "\n")
+        self._md.flush()
+        self._pdf.feed_line(line)
+        self.lines += 1
+
+    def _finish(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._md.close()
+            self._pdf.close()
+
+    def commit(self) -> None:
+        self._finish()
+        os.replace(self.partial_md, self.md_path)
+        os.replace(self.partial_pdf, self.pdf_path)
+        logger.info("Streamed %d report line(s)", self.lines)
+
+    def close(self) -> None:
+        """Discard an uncommitted draft; a no-op after `commit()`."""
+        if self._closed:
+            return
+        self._md.close()
+        self._closed = True
+        self.partial_md.unlink(missing_ok=True)
+        self.partial_pdf.unlink(missing_ok=True)
+        logger.info("Discarded unfinished report draft after %d line(s)", self.lines)
@@ -0,0 +1,174 @@
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from .log import get_logger
+from .models import Note, Section
+from .prompts import make_notes_block
+from .sections import join_sections, render_section, split_sections
+from .tokens import count_tokens
+from .trace import traced
+
+
+logger = get_logger(__name__)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_OUTLINE_LINE = re.compile(r"^\s*(#{1,4}\s+|\d+[.)]\s+|[-*]\s+)(.+)$")
+
+# Used when the plan outline yields nothing usable.
+DEFAULT_SECTIONS = [
+    "Problem",
+    "Goals / Non-Goals",
+    "Proposed Design architecture api",
+    "Failure Modes & Edge Cases",
+    "Performance & Cost latency throughput",
+    "Security & Privacy",
+    "Testing Plan",
+    "Rollout Plan",
+    "Alternatives Considered",
+]
+
+
+@dataclass
+class PackResult:
+    notes: List[Note]
+    dropped: List[Note] = field(default_factory=list)
+    tokens_used: int = 0
+    budget: int = 0
+
+
+def _terms(text: str) -> List[str]:
+    return _WORD.findall(text.lower())
+
+
+def outline_sections(plan: str, limit: int = 24) -> List[str]:
+    """Short heading/list lines from the planner output, used as ranking queries."""
+    sections = []
+    for line in plan.splitlines():
+        match = _OUTLINE_LINE.match(line)
+        if not match:
+            continue
+        text = match.group(2).strip().strip("*").strip()
+        if text and len(text.split()) <= 12 and text not in sections:
+            sections.append(text)
+        if len(sections) >= limit:
+            break
+    return sections or list(DEFAULT_SECTIONS)
+
+
+class BM25:
+    def __init__(self, docs: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.tfs = [Counter(d) for d in docs]
+        self.lens = [len(d) for d in docs]
+        self.avg_len = (sum(self.lens) / len(docs)) if docs else 0.0
+        df: Counter = Counter()
+        for tf in self.tfs:
+            df.update(tf.keys())
+        n = len(docs)
+        self.idf = {t: math.log(1 + (n - c + 0.5) / (c + 0.5)) for t, c in df.items()}
+
+    def scores(self, query: List[str]) -> List[float]:
+        out = []
+        for tf, length in zip(self.tfs, self.lens):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_len or 1.0))
+            for term in query:
+                f = tf.get(term)
+                if f:
+                    score += self.idf.get(term, 0.0) * f * (self.k1 + 1) / (f + norm)
+            out.append(score)
+        return out
+
+
+def _note_tokens(note: Note) -> int:
+    return count_tokens(make_notes_block([note])) + 1
+
+
+@traced("pack")
+def pack_notes(notes: List[Note], plan: str, budget_tokens: int) -> PackResult:
+    """
+    Fit notes into `budget_tokens`. Notes are ranked per outline section with
+    BM25 over claim/support/tags and picked round-robin across sections, so
+    every section gets its best evidence before any section gets seconds; the
+    remaining budget goes to the best-scoring leftovers. Kept notes stay in
+    their original order so the prompt (and its cache key) is stable.
+    """
+    sizes = [_note_tokens(n) for n in notes]
+    total = sum(sizes)
+    if budget_tokens <= 0 or total <= budget_tokens:
+        return PackResult(notes=list(notes), tokens_used=total, budget=budget_tokens)
+
+    bm25 = BM25([_terms(f"{n.claim} {n.support} {' '.join(n.tags)}") for n in notes])
+    per_section = []
+    best: Dict[int, float] = {}
+    for section in outline_sections(plan):
+        scores = bm25.scores(_terms(section))
+        ranked = [i for i in sorted(range(len(notes)), key=lambda i: (-scores[i], i)) if scores[i] > 0]
+        per_section.append(ranked)
+        for i in ranked:
+            best[i] = max(best.get(i, 0.0), scores[i])
+
+    chosen = set()
+    used = 0
+
+    def take(i: int) -> None:
+        nonlocal used
+        if i in chosen or used + sizes[i] > budget_tokens:
+            return
+        chosen.add(i)
+        used += sizes[i]
+
+    depth = 0
+    while any(depth < len(r) for r in per_section) and used < budget_tokens:
+        for ranked in per_section:
+            if depth < len(ranked):
+                take(ranked[depth])
+        depth += 1
+    confidence = {"high": 2, "medium": 1, "low": 0}
+    for i in sorted(range(len(notes)), key=lambda i: (-best.get(i, 0.0), -confidence.get(notes[i].confidence, 0), i)):
+        take(i)
+
+    kept = [n for i, n in enumerate(notes) if i in chosen]
+    dropped = [n for i, n in enumerate(notes) if i not in chosen]
+    logger.info(
+        "Note packing: kept %d/%d note(s), %d/%d token(s), dropped %d",
+        len(kept),
+        len(notes),
+        used,
+        budget_tokens,
+        len(dropped),
+    )
+    return PackResult(notes=kept, dropped=dropped, tokens_used=used, budget=budget_tokens)
+
+
+def fit_report(report_markdown: str, budget_tokens: int) -> str:
+    """
+    Shrink a report to roughly `budget_tokens` for review: every section keeps
+    its heading and an equal share of the budget, with bodies cut at a line
+    boundary and marked as truncated.
+    """
+    if budget_tokens <= 0 or count_tokens(report_markdown) <= budget_tokens:
+        return report_markdown
+    sections = split_sections(report_markdown)
+    share = max(1, budget_tokens // max(1, len(sections)))
+    fitted = []
+    for section in sections:
+        if count_tokens(render_section(section)) <= share:
+            fitted.append(section)
+            continue
+        kept_lines = []
+        used = count_tokens(section.title)
+        for line in section.body.splitlines():
+            cost = count_tokens(line) + 1
+            if used + cost > share:
+                break
+            kept_lines.append(line)
+            used += cost
+        kept_lines.append("[... section truncated for review ...]")
+        fitted.append(Section(title=section.title, body="\n".join(kept_lines)))
+    logger.info("Report fitted for review: %d -> %d token budget", count_tokens(report_markdown), budget_tokens)
+    return join_sections(fitted)
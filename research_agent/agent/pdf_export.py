@@ -1,54 +1,95 @@
+from functools import lru_cache
 from pathlib import Path
-from reportlab.lib.pagesizes import LETTER
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import inch
 
+from .trace import traced
 
-def _wrap_text(c, text: str, max_width: float, font_name: str, font_size: int):
+# reportlab is imported when the first PDF is rendered, not when the CLI starts.
+
+# Bounds on the width caches, which live as long as the process (a report service renders many reports).
+MAX_FONT_TABLES = 32
+MAX_CACHED_WORDS = 50000
+
+
+class WidthTable:
     """
-    Wrap text into lines that fit max_width using current canvas font metrics.
+    Cached text widths for one font/size. Each distinct word is measured once
+    (up to `MAX_CACHED_WORDS`, least recently used dropped first); line widths
+    are then accumulated from word widths plus space widths.
     """
-    c.setFont(font_name, font_size)
-    words = text.split()
+
+    def __init__(self, font_name: str, font_size: float):
+        self.font_name = font_name
+        self.font_size = font_size
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+
+        self._measure = stringWidth
+        self.space = stringWidth(" ", font_name, font_size)
+        self.width = lru_cache(maxsize=MAX_CACHED_WORDS)(self._width)
+
+    @classmethod
+    def get(cls, font_name: str, font_size: float) -> "WidthTable":
+        return _width_table(font_name, font_size)
+
+    def _width(self, word: str) -> float:
+        return self._measure(word, self.font_name, self.font_size)
+
+    def split_long(self, word: str, max_width: float):
+        """Break a token wider than the line (long URLs, hashes) into pieces that fit."""
+        pieces = []
+        cur = ""
+        cur_w = 0.0
+        for ch in word:
+            ch_w = self.width(ch)
+            if cur and cur_w + ch_w > max_width:
+                pieces.append(cur)
+                cur, cur_w = "", 0.0
+            cur += ch
+            cur_w += ch_w
+        if cur:
+            pieces.append(cur)
+        return pieces
+
+
+@lru_cache(maxsize=MAX_FONT_TABLES)
+def _width_table(font_name: str, font_size: float) -> WidthTable:
+    return WidthTable(font_name, font_size)
+
+
+def _wrap_text(text: str, max_width: float, font_name: str, font_size: int):
+    """
+    Wrap text into lines that fit max_width. Runs in linear time using cached
+    word widths; tokens wider than a full line are broken across lines.
+    """
+    table = WidthTable.get(font_name, font_size)
     lines = []
     cur = []
-    for w in words:
-        test = (" ".join(cur + [w])).strip()
-        if c.stringWidth(test, font_name, font_size) <= max_width:
-            cur.append(w)
-        else:
+    cur_w = 0.0
+    for w in text.split():
+        w_width = table.width(w)
+        if w_width > max_width:
+            pieces = table.split_long(w, max_width)
             if cur:
                 lines.append(" ".join(cur))
-            cur = [w]
+            lines.extend(pieces[:-1])
+            cur, cur_w = [pieces[-1]], table.width(pieces[-1])
+            continue
+        candidate = cur_w + table.space + w_width if cur else w_width
+        if candidate <= max_width:
+            cur.append(w)
+            cur_w = candidate
+        else:
+            lines.append(" ".join(cur))
+            cur, cur_w = [w], w_width
     if cur:
         lines.append(" ".join(cur))
     return lines
 
 
-def markdown_to_pdf(markdown: str, out_path: Path):
-    out_path = Path(out_path)
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-
-    c = canvas.Canvas(str(out_path), pagesize=LETTER)
-    width, height = LETTER
-
-    left = 0.75 * inch
-    right = 0.75 * inch
-    top = 0.75 * inch
-    bottom = 0.75 * inch
-    max_width = width - left - right
-
-    y = height - top
-
-    def new_page():
-        nonlocal y
-        c.showPage()
-        y = height - top
-
-    def ensure_space(lines_count: int, line_height: float):
-        nonlocal y
-        if y - (lines_count * line_height) < bottom:
-            new_page()
+class PdfRenderer:
+    """
+    Incremental Markdown-to-PDF renderer: lines can be fed as they are produced
+    (e.g. while the writer is still streaming) and the file is finalized by `close()`.
+    """
 
     # Basic styles
     body_font = ("Helvetica", 11)
@@ -58,71 +99,128 @@ def markdown_to_pdf(markdown: str, out_path: Path):
 
     line_height = 14
 
-    for raw in markdown.splitlines():
+    def __init__(self, out_path: Path):
+        out_path = Path(out_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        self.out_path = out_path
+
+        from reportlab.lib.pagesizes import LETTER
+        from reportlab.lib.units import inch
+        from reportlab.pdfgen import canvas
+
+        self.c = canvas.Canvas(str(out_path), pagesize=LETTER)
+        self.width, self.height = LETTER
+
+        self.left = 0.75 * inch
+        self.right = 0.75 * inch
+        self.top = 0.75 * inch
+        self.bottom = 0.75 * inch
+        self.max_width = self.width - self.left - self.right
+
+        self.y = self.height - self.top
+        self._font = None
+
+    def set_font(self, font):
+        # setFont emits PDF operators; skip it when the font is already current.
+        if font != self._font:
+            self.c.setFont(*font)
+            self._font = font
+
+    def new_page(self):
+        font = self._font
+        self.c.showPage()
+        # A new page resets the graphics state; restore the font for lines that continue on it.
+        self._font = None
+        if font is not None:
+            self.set_font(font)
+        self.y = self.height - self.top
+
+    def ensure_space(self, lines_count: int, line_height: float):
+        if self.y - (lines_count * line_height) < self.bottom:
+            self.new_page()
+
+    def feed(self, markdown: str):
+        for raw in markdown.splitlines():
+            self.feed_line(raw)
+
+    def feed_line(self, raw: str):
+        c = self.c
+        body_font = self.body_font
+        line_height = self.line_height
+        left = self.left
+        max_width = self.max_width
         line = raw.rstrip()
 
         # blank line
         if not line.strip():
-            y -= line_height * 0.6
-            if y < bottom:
-                new_page()
-            continue
+            self.y -= line_height * 0.6
+            if self.y < self.bottom:
+                self.new_page()
+            return
 
         # headings
         if line.startswith("# "):
             text = line[2:].strip()
-            ensure_space(2, line_height * 1.4)
-            c.setFont(*h1_font)
-            y -= line_height * 0.2
-            c.drawString(left, y, text)
-            y -= line_height * 1.6
-            continue
+            self.ensure_space(2, line_height * 1.4)
+            self.set_font(self.h1_font)
+            self.y -= line_height * 0.2
+            c.drawString(left, self.y, text)
+            self.y -= line_height * 1.6
+            return
 
         if line.startswith("## "):
             text = line[3:].strip()
-            ensure_space(2, line_height * 1.2)
-            c.setFont(*h2_font)
-            c.drawString(left, y, text)
-            y -= line_height * 1.3
-            continue
+            self.ensure_space(2, line_height * 1.2)
+            self.set_font(self.h2_font)
+            c.drawString(left, self.y, text)
+            self.y -= line_height * 1.3
+            return
 
         if line.startswith("### "):
             text = line[4:].strip()
-            ensure_space(2, line_height * 1.1)
-            c.setFont(*h3_font)
-            c.drawString(left, y, text)
-            y -= line_height * 1.2
-            continue
+            self.ensure_space(2, line_height * 1.1)
+            self.set_font(self.h3_font)
+            c.drawString(left, self.y, text)
+            self.y -= line_height * 1.2
+            return
 
         # bullets
         is_bullet = line.lstrip().startswith(("- ", "* "))
         if is_bullet:
             text = line.lstrip()[2:].strip()
             bullet_prefix = "• "
-            wrapped = _wrap_text(c, text, max_width - 18, body_font[0], body_font[1])
-            ensure_space(len(wrapped), line_height)
+            wrapped = _wrap_text(text, max_width - 18, body_font[0], body_font[1]) or [""]
+            self.ensure_space(len(wrapped), line_height)
 
             # first line with bullet
-            c.setFont(*body_font)
-            c.drawString(left, y, bullet_prefix + wrapped[0])
-            y -= line_height
+            self.set_font(body_font)
+            c.drawString(left, self.y, bullet_prefix + wrapped[0])
+            self.y -= line_height
 
             # continuation lines indented
             for cont in wrapped[1:]:
-                if y < bottom:
-                    new_page()
-                c.drawString(left + 18, y, cont)
-                y -= line_height
-            continue
+                if self.y < self.bottom:
+                    self.new_page()
+                c.drawString(left + 18, self.y, cont)
+                self.y -= line_height
+            return
 
         # normal paragraph line
-        wrapped = _wrap_text(c, line.strip(), max_width, body_font[0], body_font[1])
-        ensure_space(len(wrapped), line_height)
-        c.setFont(*body_font)
+        wrapped = _wrap_text(line.strip(), max_width, body_font[0], body_font[1])
+        self.ensure_space(len(wrapped), line_height)
+        self.set_font(body_font)
         for wline in wrapped:
-            if y < bottom:
-                new_page()
-            c.drawString(left, y, wline)
-            y -= line_height
+            if self.y < self.bottom:
+                self.new_page()
+            c.drawString(left, self.y, wline)
+            self.y -= line_height
 
-    c.save()
\ No newline at end of file
+    def close(self):
+        self.c.save()
+
+
+@traced("pdf")
+def markdown_to_pdf(markdown: str, out_path: Path):
+    renderer = PdfRenderer(out_path)
+    renderer.feed(markdown)
+    renderer.close()
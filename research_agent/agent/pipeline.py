@@ -0,0 +1,200 @@
+import datetime as dt
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from .cache import CacheStore
+from .chunking import ChunkConfig
+from .extract import TEXT_BUDGET
+from .http import configure_session
+from .log import get_logger
+from .models import Note, Source
+from .research import _fetch_one, _notes_for_source, iter_serper_links
+from .trace import bind, traced
+
+
+logger = get_logger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class ResearchState:
+    """
+    Sources and notes gathered so far. Source IDs are assigned once and never
+    change, so enrichment rounds only fetch and extract URLs not seen before.
+    """
+
+    sources: List[Source] = field(default_factory=list)
+    notes_by_source: Dict[str, List[Note]] = field(default_factory=dict)
+
+    @property
+    def urls(self) -> List[str]:
+        return [s.url for s in self.sources]
+
+    @property
+    def notes(self) -> List[Note]:
+        return [n for s in self.sources for n in self.notes_by_source.get(s.source_id, [])]
+
+    def add(self, source: Source, notes: List[Note]) -> None:
+        self.sources.append(source)
+        self.notes_by_source[source.source_id] = notes
+
+
+def _candidate_urls(
+    manual_urls: List[str],
+    queries: List[str],
+    max_sources: int,
+    cache: CacheStore,
+    search_workers: int,
+    known: List[str],
+) -> Iterable[str]:
+    seen = set(known)
+    for url in manual_urls:
+        if url not in seen:
+            seen.add(url)
+            yield url
+    if not queries:
+        return
+    # Known URLs may reappear in results, so allow for them on top of the new quota.
+    limit = max_sources + len(known)
+    for url in iter_serper_links(queries, max_sources=limit, cache=cache, workers=search_workers):
+        if url not in seen:
+            seen.add(url)
+            yield url
+
+
+@traced("research")
+def run_research(
+    manual_urls: List[str],
+    queries: List[str],
+    max_sources: int,
+    model: str,
+    cache: CacheStore,
+    search_workers: int = 4,
+    fetch_workers: int = 8,
+    notes_workers: int = 4,
+    queue_size: int = 4,
+    per_host: int = 2,
+    deadline_s: Optional[float] = None,
+    extractor: str = "fast",
+    parse_processes: int = 0,
+    max_bytes: int = 5 * 1024 * 1024,
+    text_budget: int = TEXT_BUDGET,
+    ttl_s: float = 0.0,
+    chunking: Optional[ChunkConfig] = None,
+    state: Optional[ResearchState] = None,
+) -> ResearchState:
+    """
+    Streaming search -> fetch -> notes pipeline. Each URL is fetched as soon as
+    search yields it and each Source goes to note extraction as soon as it is
+    parsed; bounded queues between the stages provide backpressure. URL order,
+    S# numbering and note order match the sequential stages (manual URLs first,
+    then search results in query order, capped at `max_sources` in total).
+
+    When an existing `state` is passed, its sources and notes are kept as they
+    are: only URLs it does not contain are processed, numbered after the
+    existing ones, and appended to it.
+    """
+    state = state if state is not None else ResearchState()
+    known = state.urls
+    first_idx = len(state.sources) + 1
+    remaining = max_sources - len(state.sources)
+    if remaining <= 0:
+        return state
+    now = dt.datetime.utcnow().isoformat() + "Z"
+    # The fetch deadline starts at the first fetch, so search time does not count against it.
+    deadline: Optional[float] = None
+    url_q: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+    source_q: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+    sources: Dict[int, Source] = {}
+    notes: Dict[int, List[Note]] = {}
+    errors: List[BaseException] = []
+    lock = threading.Lock()
+    configure_session(pool_maxsize=max(fetch_workers, per_host))
+
+    def produce() -> None:
+        urls = _candidate_urls(manual_urls, queries, remaining, cache, search_workers, known)
+        try:
+            produced = 0
+            # Check the cap before pulling the next URL: advancing the generator can block on another Serper query.
+            while produced < remaining and not errors:
+                url = next(urls, None)
+                if url is None:
+                    break
+                url_q.put((first_idx + produced, url))
+                produced += 1
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            # Cancels queued Serper queries.
+            urls.close()
+            for _ in range(fetch_workers):
+                url_q.put(_DONE)
+
+    def fetch_deadline() -> Optional[float]:
+        nonlocal deadline
+        if not deadline_s:
+            return None
+        with lock:
+            if deadline is None:
+                deadline = time.monotonic() + deadline_s
+            return deadline
+
+    def fetch() -> None:
+        while True:
+            item = url_q.get()
+            if item is _DONE:
+                return
+            idx, url = item
+            source = _fetch_one(
+                idx, url, cache, now, per_host, fetch_deadline(), extractor, parse_processes, max_bytes, text_budget, ttl_s
+            )
+            with lock:
+                sources[idx] = source
+            source_q.put((idx, source))
+
+    def extract() -> None:
+        while True:
+            item = source_q.get()
+            if item is _DONE:
+                return
+            idx, source = item
+            if errors:
+                continue
+            try:
+                result = _notes_for_source(source, model, cache, chunking)
+            except BaseException as e:
+                errors.append(e)
+                continue
+            with lock:
+                notes[idx] = result
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=bind(produce), name="research-search", daemon=True)]
+    threads += [threading.Thread(target=bind(fetch), name=f"research-fetch-{i}", daemon=True) for i in range(fetch_workers)]
+    extractors = [threading.Thread(target=bind(extract), name=f"research-notes-{i}", daemon=True) for i in range(notes_workers)]
+    for t in threads + extractors:
+        t.start()
+    for t in threads:
+        t.join()
+    # All fetches are queued for extraction; tell each extractor to finish.
+    for _ in extractors:
+        source_q.put(_DONE)
+    for t in extractors:
+        t.join()
+    if errors:
+        raise errors[0]
+
+    for i in sorted(sources):
+        state.add(sources[i], notes.get(i, []))
+    logger.info(
+        "Research pipeline: +%d source(s), +%d note(s) in %.2fs (total %d source(s))",
+        len(sources),
+        sum(len(n) for n in notes.values()),
+        time.monotonic() - started,
+        len(state.sources),
+    )
+    return state
@@ -1,7 +1,10 @@
-from typing import List
+from typing import List, Optional
 
 from .models import Note, Source
 
+# Part of every LLM cache key (see keys.py). Bump when cached outputs must be invalidated.
+PROMPTS_VERSION = "2"
+
 PLANNER_SYSTEM = """You are a research planner for engineering design documents.
 Return concise, actionable research plans in plain markdown."""
 
@@ -28,6 +31,15 @@ Hard rules:
 - If no sources are provided, add section: Assumptions & Limitations.
 """
 
+SECTION_WRITER_SYSTEM = """You revise one section of a middle-level engineering design doc in Markdown.
+Hard rules:
+- Use ONLY provided notes as factual grounding.
+- Do not use raw source text or outside knowledge.
+- If sources exist, technical claims must include citations [S#].
+- Fix every listed critic issue for this section.
+- Return only the section body: no heading line, no other sections.
+"""
+
 CRITIC_SYSTEM = """You are a strict report critic.
 Return JSON exactly:
 {
@@ -56,8 +68,8 @@ Produce:
 
 
 def make_notes_user(source: Source) -> str:
-    return f"""Source ID: {source.source_id}
-URL: {source.url}
+    # No source ID: the same page at a different position in the list reuses the cached notes.
+    return f"""URL: {source.url}
 Title: {source.title}
 
 Source text:
@@ -65,13 +77,39 @@ Source text:
 """
 
 
-def make_writer_user(topic: str, audience: str, length: str, plan: str, notes: List[Note], has_sources: bool) -> str:
-    notes_block = "\n".join(
+def make_chunk_notes_user(source: Source, chunk: str) -> str:
+    # No source ID or chunk index: the payload (and cache key) depends only on the chunk content.
+    return f"""URL: {source.url}
+Title: {source.title}
+
+Source excerpt:
+{chunk}
+"""
+
+
+def make_notes_block(notes: List[Note]) -> str:
+    return "\n".join(
         [
-            f"[{n.source_id}] claim={n.claim}\nsupport={n.support}\ntags={','.join(n.tags)}\nconfidence={n.confidence}"
+            f"{n.citations} claim={n.claim}\nsupport={n.support}\ntags={','.join(n.tags)}\nconfidence={n.confidence}"
             for n in notes
         ]
     )
+
+
+def make_writer_user(
+    topic: str,
+    audience: str,
+    length: str,
+    plan: str,
+    notes: List[Note],
+    has_sources: bool,
+    issues: Optional[List[str]] = None,
+) -> str:
+    notes_block = make_notes_block(notes)
+    # A rewrite carries the critic's issues, so it is a different prompt (and cache key) from the draft it replaces.
+    issues_block = ""
+    if issues:
+        issues_block = "\nCritic issues with the previous draft (fix all of them):\n" + "\n".join(f"- {i}" for i in issues) + "\n"
     return f"""Topic: {topic}
 Audience: {audience}
 Length: {length}
@@ -79,6 +117,36 @@ Sources available: {has_sources}
 
 Planner output:
 {plan}
+{issues_block}
+Extracted notes (only allowed evidence):
+{notes_block if notes_block else '(none)'}
+"""
+
+
+def make_section_user(
+    topic: str,
+    audience: str,
+    section_title: str,
+    section_body: str,
+    issues: List[str],
+    other_titles: List[str],
+    notes: List[Note],
+    has_sources: bool,
+) -> str:
+    notes_block = make_notes_block(notes)
+    issues_block = "\n".join(f"- {i}" for i in issues)
+    return f"""Topic: {topic}
+Audience: {audience}
+Sources available: {has_sources}
+Other sections (unchanged): {', '.join(other_titles)}
+
+Section to revise: {section_title}
+
+Current section body:
+{section_body}
+
+Critic issues for this section:
+{issues_block}
 
 Extracted notes (only allowed evidence):
 {notes_block if notes_block else '(none)'}
@@ -0,0 +1,77 @@
+import threading
+import time
+from typing import Optional
+
+from .log import get_logger
+from .tokens import count_tokens
+
+
+logger = get_logger(__name__)
+
+
+class TokenBucket:
+    """
+    Continuous-refill token bucket. `rate_per_min` tokens are added per minute up to
+    `rate_per_min` capacity. A rate of 0 disables the bucket.
+    """
+
+    def __init__(self, rate_per_min: float):
+        self.rate_per_min = float(rate_per_min)
+        self.capacity = float(rate_per_min)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate_per_min > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_min / 60.0)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` tokens and return how long the caller must wait before using them."""
+        if not self.enabled:
+            return 0.0
+        # Never ask for more than a full bucket, otherwise a single large call would wait forever.
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens * 60.0 / self.rate_per_min
+
+    def debit(self, amount: float) -> None:
+        """Charge (or refund, when negative) tokens after the fact, e.g. from reported usage."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits shared by every LLM caller."""
+
+    def __init__(self, requests_per_min: float = 0, tokens_per_min: float = 0):
+        self.requests = TokenBucket(requests_per_min)
+        self.tokens = TokenBucket(tokens_per_min)
+
+    def acquire(self, tokens: int) -> float:
+        wait_s = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        if wait_s > 0:
+            logger.info("Rate limit: waiting %.2fs (est_tokens=%d)", wait_s, tokens)
+            time.sleep(wait_s)
+        return wait_s
+
+    def settle(self, estimated: int, actual: Optional[int]) -> None:
+        if actual is None:
+            return
+        self.tokens.debit(actual - estimated)
+
+
+def estimate_tokens(*texts: str) -> int:
+    return sum(count_tokens(t) for t in texts) + 1
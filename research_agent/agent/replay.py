@@ -0,0 +1,341 @@
+import base64
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from . import http, llm
+from .http import HTML_CONTENT_TYPES
+from .keys import content_hash
+from .log import get_logger
+
+
+logger = get_logger(__name__)
+
+SERPER_URL = "https://google.serper.dev/search"
+# Response headers kept in recorded page fetches (content gating, validators, freshness).
+RECORDED_HEADERS = ("content-type", "etag", "last-modified", "cache-control")
+# Request headers dropped when recording, so the stored response is never a 304.
+CONDITIONAL_HEADERS = ("if-none-match", "if-modified-since")
+CHANNELS = ("llm", "search", "http")
+STREAM_DELTA_CHARS = 16
+USAGE_FIELDS = ("input_tokens", "output_tokens", "total_tokens")
+
+
+class ReplayMiss(KeyError):
+    """Raised in replay mode when a request is not in the cassette and there is no responder."""
+
+
+class InjectedFailure(RuntimeError):
+    """Synthetic failure raised by the replay layer."""
+
+    # Retried by `llm.py` like a transient server error.
+    status_code = 503
+
+
+@dataclass
+class Fault:
+    latency_s: float = 0.0
+    failure_rate: float = 0.0
+
+
+@dataclass
+class ReplayConfig:
+    """
+    Synthetic latency and failures applied to replayed calls, per channel.
+    Latency varies by +/- `jitter` (a fraction of `latency_s`). The same seed
+    gives the same sequence of delays and failures.
+    """
+
+    llm: Fault = field(default_factory=Fault)
+    search: Fault = field(default_factory=Fault)
+    http: Fault = field(default_factory=Fault)
+    jitter: float = 0.25
+    seed: int = 0
+
+
+class Cassette:
+    """Recorded LLM, Serper and HTTP responses, stored as one JSON file."""
+
+    def __init__(self, path: Optional[Path] = None, entries: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.path = Path(path) if path else None
+        self.entries: Dict[str, Dict[str, Any]] = {c: {} for c in CHANNELS}
+        for channel, records in (entries or {}).items():
+            self.entries.setdefault(channel, {}).update(records)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: Path) -> "Cassette":
+        path = Path(path)
+        if not path.exists():
+            return cls(path)
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return cls(path, data.get("entries", {}))
+
+    def get(self, channel: str, key: str) -> Optional[Any]:
+        with self._lock:
+            return self.entries[channel].get(key)
+
+    def put(self, channel: str, key: str, record: Any) -> None:
+        with self._lock:
+            self.entries[channel][key] = record
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            data = {"version": 1, "entries": self.entries}
+            raw = json.dumps(data, ensure_ascii=False, sort_keys=True)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(raw, encoding="utf-8")
+        os.replace(tmp, self.path)
+        logger.info("Cassette saved to %s (%s)", self.path, ", ".join(f"{c}={len(self.entries[c])}" for c in CHANNELS))
+
+
+def _pack_body(body: bytes) -> str:
+    return base64.b64encode(zlib.compress(body, 6)).decode("ascii")
+
+
+def _unpack_body(packed: str) -> bytes:
+    return zlib.decompress(base64.b64decode(packed)) if packed else b""
+
+
+def llm_record_key(model: str, system: str, user: str) -> str:
+    # Streaming and non-streaming calls share a record: only the text is replayed.
+    return content_hash(model, system, user)
+
+
+def search_record_key(payload: dict) -> str:
+    return json.dumps(payload, sort_keys=True, ensure_ascii=False)
+
+
+def http_record_key(method: str, url: str) -> str:
+    return f"{method.upper()} {url}"
+
+
+class ReplayResponse:
+    """The subset of `requests.Response` used by `http.download_text` and the Serper client."""
+
+    def __init__(self, url: str, status_code: int, headers: Dict[str, str], body: bytes):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = body
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+    def iter_content(self, chunk_size: int = 64 * 1024):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start : start + chunk_size]
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "ReplayResponse":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ReplayClient:
+    """Stands in for `OpenAI()`; `llm.py` only calls `client.responses.create`."""
+
+    def __init__(self, replay: "Replay"):
+        self._replay = replay
+        self.responses = self
+
+    def create(self, model: str, input: list, stream: bool = False, **kwargs):
+        system = next((m["content"] for m in input if m.get("role") == "system"), "")
+        user = next((m["content"] for m in input if m.get("role") == "user"), "")
+        text, usage = self._replay.llm_response(model, system, user)
+        usage = SimpleNamespace(**usage)
+        if not stream:
+            return SimpleNamespace(output_text=text, usage=usage)
+        return self._events(text, usage)
+
+    @staticmethod
+    def _events(text: str, usage):
+        for start in range(0, len(text), STREAM_DELTA_CHARS):
+            yield SimpleNamespace(type="response.output_text.delta", delta=text[start : start + STREAM_DELTA_CHARS])
+        yield SimpleNamespace(type="response.completed", response=SimpleNamespace(usage=usage))
+
+
+class ReplaySession:
+    """Stands in for the shared `requests.Session`: Serper POSTs and page GETs."""
+
+    def __init__(self, replay: "Replay"):
+        self._replay = replay
+        self.headers = CaseInsensitiveDict({"User-Agent": "Mozilla/5.0"})
+
+    def post(self, url: str, json: Optional[dict] = None, **kwargs) -> ReplayResponse:
+        if url == SERPER_URL:
+            return self._replay.search_response(json or {}, kwargs)
+        return self._replay.http_response("POST", url, kwargs)
+
+    def get(self, url: str, **kwargs) -> ReplayResponse:
+        return self._replay.http_response("GET", url, kwargs)
+
+
+class Replay:
+    """
+    Record/replay layer for the three I/O paths: the OpenAI client used by
+    `llm.py`, Serper search and page fetches through the shared HTTP session.
+
+    - `mode="record"` forwards calls to the real client/session and stores the
+      responses in the cassette.
+    - `mode="replay"` serves responses from the cassette, adding the latency and
+      failures from `config`. Misses go to `responder` (an object with `llm`,
+      `search` and `http` methods, see `benchmarks/corpus.py`) or raise
+      `ReplayMiss`.
+
+    Use as a context manager: the stand-ins are installed with
+    `llm.set_client`/`http.set_session` on entry, and the previous ones are
+    restored (and a recorded cassette saved) on exit.
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        mode: str = "replay",
+        config: Optional[ReplayConfig] = None,
+        responder: Any = None,
+    ):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown replay mode {mode!r}; expected 'record' or 'replay'")
+        self.cassette = cassette
+        self.mode = mode
+        self.config = config or ReplayConfig()
+        self.responder = responder
+        self.stats: Counter = Counter()
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        self._real_client = None
+        self._real_session = None
+        self._saved: Optional[Tuple[Any, Any]] = None
+
+    def __enter__(self) -> "Replay":
+        self._saved = (llm._client, http._session)
+        if self.mode == "record":
+            self._real_client = llm.get_client()
+            self._real_session = http.get_session()
+        llm.set_client(ReplayClient(self))
+        http.set_session(ReplaySession(self))
+        logger.info("Replay layer installed mode=%s", self.mode)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        client, session = self._saved
+        llm.set_client(client)
+        http.set_session(session)
+        if self.mode == "record":
+            self.cassette.save()
+
+    def _inject(self, channel: str) -> None:
+        """Sleep for the channel's synthetic latency; raise if a failure is drawn."""
+        if self.mode != "replay":
+            return
+        fault: Fault = getattr(self.config, channel)
+        with self._rng_lock:
+            scale = 1 + self._rng.uniform(-self.config.jitter, self.config.jitter)
+            failed = fault.failure_rate > 0 and self._rng.random() < fault.failure_rate
+        if fault.latency_s > 0:
+            time.sleep(max(0.0, fault.latency_s * scale))
+        if failed:
+            self.stats[f"{channel}.injected_failures"] += 1
+            raise InjectedFailure(f"injected {channel} failure")
+
+    def _missing(self, channel: str, key: str) -> None:
+        self.stats[f"{channel}.misses"] += 1
+        if self.responder is None:
+            raise ReplayMiss(f"{channel} request not in cassette: {key[:200]}")
+
+    def llm_response(self, model: str, system: str, user: str) -> Tuple[str, Dict[str, Optional[int]]]:
+        key = llm_record_key(model, system, user)
+        self.stats["llm.calls"] += 1
+        self._inject("llm")
+        record = self.cassette.get("llm", key)
+        if record is None and self.mode == "record":
+            resp = self._real_client.responses.create(
+                model=model, input=[{"role": "system", "content": system}, {"role": "user", "content": user}]
+            )
+            usage = getattr(resp, "usage", None)
+            record = {"text": resp.output_text, **{k: getattr(usage, k, None) for k in USAGE_FIELDS}}
+            self.cassette.put("llm", key, record)
+        elif record is None:
+            self._missing("llm", key)
+            text = self.responder.llm(model, system, user)
+            prompt_tokens, output_tokens = (len(system) + len(user)) // 4, len(text) // 4
+            record = {
+                "text": text,
+                "input_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": prompt_tokens + output_tokens,
+            }
+        return record["text"], {k: record.get(k) for k in USAGE_FIELDS}
+
+    def search_response(self, payload: dict, kwargs: dict) -> ReplayResponse:
+        key = search_record_key(payload)
+        self.stats["search.calls"] += 1
+        self._inject("search")
+        record = self.cassette.get("search", key)
+        if record is None and self.mode == "record":
+            resp = self._real_session.post(SERPER_URL, json=payload, **kwargs)
+            record = {"status": resp.status_code, "body": resp.json() if resp.ok else {}}
+            self.cassette.put("search", key, record)
+        elif record is None:
+            self._missing("search", key)
+            record = {"status": 200, "body": self.responder.search(payload)}
+        body = json.dumps(record["body"]).encode("utf-8")
+        return ReplayResponse(SERPER_URL, record["status"], {"Content-Type": "application/json"}, body)
+
+    def http_response(self, method: str, url: str, kwargs: dict) -> ReplayResponse:
+        key = http_record_key(method, url)
+        self.stats["http.calls"] += 1
+        self._inject("http")
+        record = self.cassette.get("http", key)
+        if record is None and self.mode == "record":
+            record = self._record_http(method, url, kwargs)
+            self.cassette.put("http", key, record)
+        elif record is None:
+            self._missing("http", key)
+            status, headers, body = self.responder.http(method, url)
+            record = {"status": status, "headers": headers, "body": _pack_body(body)}
+        if "error" in record:
+            raise requests.ConnectionError(record["error"])
+        return ReplayResponse(url, record["status"], record.get("headers", {}), _unpack_body(record.get("body", "")))
+
+    def _record_http(self, method: str, url: str, kwargs: dict) -> dict:
+        # Records are keyed by method and URL only, so record the full response: a 304 to the
+        # caller's conditional GET would otherwise be replayed for unconditional ones.
+        headers = {k: v for k, v in (kwargs.get("headers") or {}).items() if k.lower() not in CONDITIONAL_HEADERS}
+        kwargs = {**kwargs, "headers": headers, "stream": True}
+        try:
+            with self._real_session.request(method, url, **kwargs) as r:
+                kept = {k: v for k, v in r.headers.items() if k.lower() in RECORDED_HEADERS}
+                content_type = r.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                # Like download_text, do not pull bodies that would be skipped anyway.
+                body = r.content if not content_type or content_type.startswith(HTML_CONTENT_TYPES) else b""
+                return {"status": r.status_code, "headers": kept, "body": _pack_body(body)}
+        except requests.RequestException as e:
+            return {"error": f"{type(e).__name__}: {e}"}
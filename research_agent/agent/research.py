@@ -1,160 +1,337 @@
-import datetime as dt
 import os
-import re
-from typing import List
-
-import requests
-from bs4 import BeautifulSoup
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
 
 from .cache import CacheStore
-from .log import get_logger
+from .chunking import ChunkConfig, chunk_text, select_chunks
+from .dedup import collapse_duplicates
+from .extract import TEXT_BUDGET, extract
+from .http import (
+    Download,
+    UnsupportedContent,
+    conditional_headers,
+    download_text,
+    get_session,
+    host_limit,
+    is_fresh,
+)
+from .keys import llm_key
+from .log import get_logger, log_payload
 from .llm import llm_json
 from .models import Note, Source
-from .prompts import NOTES_SYSTEM, make_notes_user
+from .prompts import NOTES_SYSTEM, make_chunk_notes_user, make_notes_user
+from .trace import annotate, bind, get_tracer, span
 
 
 logger = get_logger(__name__)
 
 
-def _slug_id(i: int) -> str:
-    return f"S{i}"
+# Per-entry HTTP metadata used to decide when and how to revalidate a fetch entry.
+HTTP_META_KEYS = ("fetched_at", "etag", "last_modified", "cache_control")
 
 
-def _clean_text(text: str) -> str:
-    return re.sub(r"\s+", " ", text).strip()
+def _slug_id(i: int) -> str:
+    return f"S{i}"
 
 
-def plan_cache_key(topic: str, audience: str, length: str) -> str:
-    return f"plan::{topic}::{audience}::{length}"
+def _serper_query(q: str, api_key: str, cache: CacheStore) -> dict:
+    with span("search", query=q) as sp:
+        key = f"serper::{q}::num=10"
+        cached = cache.get("serper", key)
+        logger.info("Serper query: %s (%s)", q, "cache" if cached is not None else "live")
+        sp.set(cached=cached is not None)
+        if cached is not None:
+            return cached
+        request_payload = {"q": q, "num": 10}
+        request_meta = {
+            "method": "POST",
+            "url": "https://google.serper.dev/search",
+            "headers": {"X-API-KEY": "***redacted***", "Content-Type": "application/json"},
+            "json": request_payload,
+            "timeout": 25,
+        }
+        logger.info("Serper request=%s", request_meta)
+        resp = get_session().post(
+            "https://google.serper.dev/search",
+            headers={"X-API-KEY": api_key, "Content-Type": "application/json"},
+            json=request_payload,
+            timeout=25,
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        cache.set("serper", key, data)
+        return data
 
 
-def search_serper(queries: List[str], max_sources: int, cache: CacheStore) -> List[str]:
+def iter_serper_links(queries: List[str], max_sources: int, cache: CacheStore, workers: int = 4) -> Iterator[str]:
+    """
+    Run queries concurrently but yield links strictly in query order, so URL
+    selection is the same as a sequential run. Once the ordered prefix yields
+    `max_sources` unique links (or the consumer stops iterating), queued queries
+    are cancelled and in-flight ones are abandoned.
+    """
     if not queries:
-        return []
+        return
     api_key = os.getenv("SERPER_API_KEY")
     if not api_key:
         raise RuntimeError("Missing SERPER_API_KEY while --search is enabled.")
 
-    urls: List[str] = []
     seen = set()
 
-    logger.info("Searching with Serper across %d query(s)", len(queries))
+    logger.info("Searching with Serper across %d query(s) workers=%d", len(queries), workers)
 
-    for q in queries:
-        key = f"serper::{q}::num=10"
-        cached = cache.get("serper", key)
-        logger.info("Serper query: %s (%s)", q, "cache" if cached is not None else "live")
-        if cached is None:
-            request_payload = {"q": q, "num": 10}
-            request_meta = {
-                "method": "POST",
-                "url": "https://google.serper.dev/search",
-                "headers": {"X-API-KEY": "***redacted***", "Content-Type": "application/json"},
-                "json": request_payload,
-                "timeout": 25,
-            }
-            logger.info("Serper request=%s", request_meta)
-            resp = requests.post(
-                "https://google.serper.dev/search",
-                headers={"X-API-KEY": api_key, "Content-Type": "application/json"},
-                json=request_payload,
-                timeout=25,
+    pool = ThreadPoolExecutor(max_workers=max(1, min(workers, len(queries))), thread_name_prefix="serper")
+    try:
+        futures = [pool.submit(bind(_serper_query), q, api_key, cache) for q in queries]
+        for pos, fut in enumerate(futures):
+            data = fut.result()
+            for item in data.get("organic", []):
+                link = item.get("link")
+                if not link or link in seen:
+                    continue
+                seen.add(link)
+                yield link
+                if len(seen) >= max_sources:
+                    logger.info("Serper cutoff after %d/%d query(s)", pos + 1, len(queries))
+                    return
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _failed_source(idx: int, url: str, error: BaseException, now: str) -> Source:
+    return Source(
+        source_id=_slug_id(idx),
+        url=url,
+        title=f"(Failed to fetch) {url}",
+        text=f"ERROR: {type(error).__name__}: {error}",
+        retrieved_at=now,
+        status="failed",
+    )
+
+
+def _skipped_source(idx: int, url: str, reason: str, now: str) -> Source:
+    return Source(
+        source_id=_slug_id(idx),
+        url=url,
+        title=f"(Skipped) {url}",
+        text=f"SKIPPED: {reason}",
+        retrieved_at=now,
+        status="skipped",
+    )
+
+
+def _fetch_one(
+    idx: int,
+    url: str,
+    cache: CacheStore,
+    now: str,
+    per_host: int,
+    deadline: Optional[float],
+    extractor: str,
+    parse_processes: int,
+    max_bytes: int,
+    text_budget: int = TEXT_BUDGET,
+    ttl_s: float = 0.0,
+) -> Source:
+    with span("fetch", url=url, bytes=0) as sp:
+        source = _fetch_source(
+            idx, url, cache, now, per_host, deadline, extractor, parse_processes, max_bytes, text_budget, ttl_s
+        )
+        sp.set(status=source.status)
+        return source
+
+
+def _download(
+    url: str, per_host: int, deadline: Optional[float], max_bytes: int, headers: Optional[dict] = None
+) -> Download:
+    with host_limit(url, per_host):
+        timeout = 20.0
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                raise TimeoutError("fetch stage deadline exceeded")
+        request_meta = {
+            "method": "GET",
+            "url": url,
+            "headers": {"User-Agent": "Mozilla/5.0", **(headers or {})},
+            "timeout": round(timeout, 1),
+        }
+        logger.info("Fetch request=%s", request_meta)
+        download = download_text(url, timeout=timeout, max_bytes=max_bytes, headers=headers, deadline=deadline)
+    annotate(bytes=download.bytes_read, http_status=download.status)
+    get_tracer().add("fetch.bytes", download.bytes_read)
+    return download
+
+
+def _http_meta(download: Optional[Download], previous: Optional[dict]) -> dict:
+    """Validators and freshness stored with a fetch entry; kept from `previous` when nothing new was downloaded."""
+    if download is None:
+        return {k: previous[k] for k in HTTP_META_KEYS if previous and k in previous}
+    meta = {"fetched_at": time.time()}
+    for k in ("etag", "last_modified", "cache_control"):
+        value = getattr(download, k)
+        if value is None and download.not_modified and previous:
+            # A 304 may omit headers that are unchanged.
+            value = previous.get(k)
+        if value is not None:
+            meta[k] = value
+    return meta
+
+
+def _fetch_source(
+    idx: int,
+    url: str,
+    cache: CacheStore,
+    now: str,
+    per_host: int,
+    deadline: Optional[float],
+    extractor: str,
+    parse_processes: int,
+    max_bytes: int,
+    text_budget: int,
+    ttl_s: float,
+) -> Source:
+    key = f"fetch::{url}"
+    try:
+        cached = cache.get("fetch", key)
+        stale = cached is not None and not is_fresh(cached.get("fetched_at"), cached.get("cache_control"), ttl_s)
+        logger.info("Fetch source %s (%s)", url, "live" if cached is None else "revalidate" if stale else "cache")
+        annotate(cached=cached is not None and not stale)
+        download = None
+        if stale:
+            validators = conditional_headers(cached.get("etag"), cached.get("last_modified"))
+            try:
+                download = _download(url, per_host, deadline, max_bytes, headers=validators)
+            except UnsupportedContent:
+                raise
+            except Exception as e:
+                # Stale-if-error: a failed revalidation keeps serving the stored copy.
+                logger.warning("Revalidation failed for %s (%s); using cached copy", url, e)
+            if download is not None and download.not_modified:
+                logger.info("Source %s not modified; reusing cached body and text", url)
+                annotate(cached=True, not_modified=True)
+                get_tracer().add("fetch.not_modified")
+                cached = {**cached, **_http_meta(download, cached)}
+                cache.set("fetch", key, cached)
+                download = None
+            elif download is not None:
+                cached = None
+        if cached is not None and cached.get("status") == "skipped":
+            return _skipped_source(idx, url, cached.get("reason", "unsupported content"), now)
+        status = cached.get("status", "ok") if cached is not None else "ok"
+        if (
+            cached is not None
+            and "text" in cached
+            and cached.get("extractor", "bs4") == extractor
+            and cached.get("budget", TEXT_BUDGET) == text_budget
+        ):
+            # Parsed entry: no decompression or HTML parsing on a hit.
+            title = cached.get("title") or url
+            return Source(
+                source_id=_slug_id(idx), url=url, title=title, text=cached["text"], retrieved_at=now, status=status
             )
-            resp.raise_for_status()
-            data = resp.json()
-            cache.set("serper", key, data)
+        body = cache.get_blob(cached["blob"]) if cached is not None and cached.get("blob") else None
+        if body is not None:
+            # Parsed with a different extractor or budget: re-extract from the stored body.
+            html = body.decode("utf-8")
+        elif cached is None or "html" not in cached:
+            if download is None:
+                download = _download(url, per_host, deadline, max_bytes)
+            html = download.text
+            if download.truncated:
+                status = "truncated"
+                logger.info("Source %s truncated at %d byte(s)", url, download.bytes_read)
         else:
-            data = cached
-
-        for item in data.get("organic", []):
-            link = item.get("link")
-            if not link or link in seen:
-                continue
-            seen.add(link)
-            urls.append(link)
-            if len(urls) >= max_sources:
-                return urls
-
-    return urls
-
-
-def fetch_sources(urls: List[str], cache: CacheStore) -> List[Source]:
-    sources: List[Source] = []
-    now = dt.datetime.utcnow().isoformat() + "Z"
-
-    logger.info("Fetching %d URL(s)", len(urls))
-
-    for idx, url in enumerate(urls, start=1):
-        try:
-            key = f"fetch::{url}"
-            cached = cache.get("fetch", key)
-            logger.info("Fetch source %s (%s)", url, "cache" if cached is not None else "live")
-            if cached is None:
-                request_meta = {
-                    "method": "GET",
-                    "url": url,
-                    "headers": {"User-Agent": "Mozilla/5.0"},
-                    "timeout": 20,
-                }
-                logger.info("Fetch request=%s", request_meta)
-                r = requests.get(url, timeout=20, headers={"User-Agent": "Mozilla/5.0"})
-                r.raise_for_status()
-                html = r.text
-                cache.set("fetch", key, {"html": html})
-            else:
-                html = cached.get("html", "")
-
-            soup = BeautifulSoup(html, "html.parser")
-            title = soup.title.get_text(strip=True) if soup.title else url
-            for tag in soup(["script", "style", "noscript"]):
-                tag.decompose()
-            text = _clean_text(soup.get_text(" ", strip=True))[:12000]
-
-            sources.append(Source(source_id=_slug_id(idx), url=url, title=title, text=text, retrieved_at=now))
-        except Exception as e:
-            logger.warning("Failed to fetch source %s: %s", url, e)
-            sources.append(
-                Source(
-                    source_id=_slug_id(idx),
-                    url=url,
-                    title=f"(Failed to fetch) {url}",
-                    text=f"ERROR: {type(e).__name__}: {e}",
-                    retrieved_at=now,
-                )
-            )
-    return sources
+            # Legacy entry with inline HTML; it is upgraded to the blob layout below.
+            html = cached.get("html", "")
+
+        title, text = extract(html, url, name=extractor, budget=text_budget, processes=parse_processes)
+        blob = cache.put_blob(html.encode("utf-8"))
+        entry = {"blob": blob, "title": title, "text": text, "extractor": extractor, "budget": text_budget}
+        cache.set("fetch", key, {**entry, **_http_meta(download, cached), "status": status})
 
+        return Source(source_id=_slug_id(idx), url=url, title=title, text=text, retrieved_at=now, status=status)
+    except UnsupportedContent as e:
+        logger.info("Skipping source %s: %s", url, e)
+        cache.set("fetch", key, {"status": "skipped", "reason": str(e), "fetched_at": time.time()})
+        return _skipped_source(idx, url, str(e), now)
+    except Exception as e:
+        logger.warning("Failed to fetch source %s: %s", url, e)
+        return _failed_source(idx, url, e, now)
 
-def extract_notes(sources: List[Source], model: str, cache: CacheStore) -> List[Note]:
+
+def _payload_notes(payload: dict, source: Source) -> List[Note]:
     notes: List[Note] = []
-    logger.info("Extracting notes from %d source(s)", len(sources))
-    for source in sources:
-        key = f"notes::{source.url}::{model}"
-        cached = cache.get("notes", key)
-        logger.info("Notes for %s (%s)", source.url, "cache" if cached is not None else "llm")
-        if cached is None:
-            notes_user = make_notes_user(source)
-            logger.info("make_notes_user() output=%s", notes_user)
-            payload = llm_json(model=model, system=NOTES_SYSTEM, user=notes_user)
-            cache.set("notes", key, payload)
-        else:
-            payload = cached
-
-        for item in payload.get("notes", []):
-            claim = item.get("claim", "").strip()
-            support = item.get("support", "").strip()
-            tags = item.get("tags") or ["other"]
-            confidence = item.get("confidence", "low")
-            if not claim:
-                continue
-            notes.append(
-                Note(
-                    claim=claim,
-                    support=support,
-                    tags=tags,
-                    confidence=confidence,
-                    source_id=source.source_id,
-                    url=source.url,
-                )
+    for item in payload.get("notes", []):
+        claim = item.get("claim", "").strip()
+        support = item.get("support", "").strip()
+        tags = item.get("tags") or ["other"]
+        confidence = item.get("confidence", "low")
+        if not claim:
+            continue
+        notes.append(
+            Note(
+                claim=claim,
+                support=support,
+                tags=tags,
+                confidence=confidence,
+                source_id=source.source_id,
+                url=source.url,
             )
+        )
     return notes
+
+
+def _cached_llm_notes(notes_user: str, model: str, cache: CacheStore, label: str) -> dict:
+    key = llm_key("notes", model, NOTES_SYSTEM, notes_user)
+    cached = cache.get("notes", key)
+    logger.info("Notes for %s (%s)", label, "cache" if cached is not None else "llm")
+    if cached is not None:
+        return cached
+    log_payload(logger, "make_notes_user() output", notes_user)
+    payload = llm_json(model=model, system=NOTES_SYSTEM, user=notes_user)
+    # Persist as soon as this call finishes so an interrupted run keeps it.
+    cache.set("notes", key, payload)
+    return payload
+
+
+def _chunked_notes(source: Source, model: str, cache: CacheStore, chunking: ChunkConfig) -> List[Note]:
+    chunks = chunk_text(source.text, target_chars=chunking.target_chars, overlap_chars=chunking.overlap_chars)
+    selected = select_chunks(chunks, chunking.effective_token_budget())
+    logger.info(
+        "Notes for %s: %d/%d chunk(s) within budget (%d chars)",
+        source.url,
+        len(selected),
+        len(chunks),
+        len(source.text),
+    )
+
+    def extract_chunk(chunk: str) -> List[Note]:
+        with span("notes", url=source.url, chunk_chars=len(chunk)):
+            payload = _cached_llm_notes(make_chunk_notes_user(source, chunk), model, cache, label=f"{source.url} chunk")
+            return _payload_notes(payload, source)
+
+    workers = max(1, min(chunking.workers, len(selected)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunk") as pool:
+        per_chunk = list(pool.map(bind(extract_chunk), selected))
+    notes = [n for chunk_notes in per_chunk for n in chunk_notes]
+    if chunking.dedup_threshold <= 0:
+        return notes
+    # Overlapping chunks restate the same facts; reduce them to one set per source.
+    merged, _ = collapse_duplicates(notes, threshold=chunking.dedup_threshold)
+    return merged
+
+
+def _notes_for_source(
+    source: Source, model: str, cache: CacheStore, chunking: Optional[ChunkConfig] = None
+) -> List[Note]:
+    if source.status in ("failed", "skipped"):
+        # Nothing to ground notes on; don't pay for an LLM call on an error string.
+        return []
+    chunking = chunking or ChunkConfig()
+    if len(source.text) > chunking.single_call_chars:
+        return _chunked_notes(source, model, cache, chunking)
+    with span("notes", url=source.url):
+        payload = _cached_llm_notes(make_notes_user(source), model, cache, label=source.url)
+        return _payload_notes(payload, source)
@@ -0,0 +1,136 @@
+import random
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional
+
+
+# Error classes returned by `classify_error`. Only "fatal" errors are never retried.
+RATE_LIMIT = "rate_limit"
+SERVER = "server"
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+FATAL = "fatal"
+
+_TIMEOUT_NAMES = ("APITimeoutError", "Timeout", "ReadTimeout", "ConnectTimeout", "TimeoutException")
+_CONNECTION_NAMES = ("APIConnectionError", "ConnectionError", "ConnectError", "RemoteProtocolError")
+
+
+class LLMTimeout(TimeoutError):
+    """An LLM attempt or a whole call (including its retries) ran past its time limit."""
+
+
+@dataclass
+class CallPolicy:
+    """
+    Time limits and retry/hedging behaviour for LLM calls.
+
+    - `deadline_s` bounds a whole call including retries and backoff;
+      `stage_deadlines` overrides it per pipeline stage ("plan", "notes",
+      "write", "section", "critic"). 0 means no deadline.
+    - `attempt_timeout_s` bounds a single request (0 = client default).
+    - Failed attempts are retried up to `max_attempts` in total with full-jitter
+      exponential backoff; rate limits back off from `rate_limit_base_s` and
+      honour a server-sent Retry-After.
+    - With `hedge`, a duplicate request is sent once an attempt has been running
+      longer than the stage's `hedge_quantile` latency (after `hedge_min_samples`
+      calls), and whichever answers first is used.
+    """
+
+    deadline_s: float = 0.0
+    stage_deadlines: Dict[str, float] = field(default_factory=dict)
+    attempt_timeout_s: float = 0.0
+    max_attempts: int = 4
+    backoff_base_s: float = 0.5
+    rate_limit_base_s: float = 2.0
+    backoff_max_s: float = 30.0
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 8
+
+    def deadline_for(self, stage: Optional[str]) -> float:
+        return self.stage_deadlines.get(stage or "", self.deadline_s)
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(exc: BaseException) -> str:
+    """
+    Map an exception from the OpenAI client (or a stand-in) to an error class
+    by HTTP status or exception name, so `openai` need not be imported.
+    """
+    status = _status_code(exc)
+    if status == 429:
+        return RATE_LIMIT
+    if status is not None:
+        return SERVER if status >= 500 or status in (408, 409) else FATAL
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if isinstance(exc, TimeoutError) or names.intersection(_TIMEOUT_NAMES):
+        return TIMEOUT
+    if isinstance(exc, ConnectionError) or names.intersection(_CONNECTION_NAMES):
+        return CONNECTION
+    return FATAL
+
+
+def retry_after_s(exc: BaseException) -> Optional[float]:
+    """Server-requested wait from Retry-After / retry-after-ms response headers, if any."""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def backoff_s(kind: str, attempt: int, policy: CallPolicy, retry_after: Optional[float] = None, rng=random) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (1-based)."""
+    base = policy.rate_limit_base_s if kind == RATE_LIMIT else policy.backoff_base_s
+    delay = rng.uniform(0, min(policy.backoff_max_s, base * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, policy.backoff_max_s))
+    return delay
+
+
+class LatencyWindow:
+    """Recent successful call latencies, used to pick the hedging delay."""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class CallStats:
+    """Thread-safe counters for attempts, retries, timeouts and hedges."""
+
+    def __init__(self):
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counts[name] += value
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
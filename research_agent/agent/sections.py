@@ -0,0 +1,70 @@
+import re
+from typing import Dict, List, Tuple
+
+from .models import Section
+
+
+_HEADING = re.compile(r"^##\s+(.*\S)\s*$")
+_WORD = re.compile(r"[a-z0-9]+")
+# Function words and "section", which carry no signal when matching an issue to a section title.
+_STOPWORDS = {"and", "the", "of", "a", "an", "to", "for", "in", "on", "section"}
+
+
+def split_sections(markdown: str) -> List[Section]:
+    """
+    Split a report on `## ` headings. Text before the first heading (e.g. the
+    `# Title` line) becomes a section with an empty title.
+    """
+    sections: List[Section] = []
+    title = ""
+    lines: List[str] = []
+    for line in markdown.splitlines():
+        match = _HEADING.match(line)
+        if match:
+            if title or any(x.strip() for x in lines):
+                sections.append(Section(title=title, body="\n".join(lines).strip("\n")))
+            title = match.group(1)
+            lines = []
+        else:
+            lines.append(line)
+    if title or any(x.strip() for x in lines):
+        sections.append(Section(title=title, body="\n".join(lines).strip("\n")))
+    return sections
+
+
+def render_section(section: Section) -> str:
+    if not section.title:
+        return section.body
+    return f"## {section.title}\n{section.body}".rstrip()
+
+
+def join_sections(sections: List[Section]) -> str:
+    return "\n\n".join(render_section(s) for s in sections).strip() + "\n"
+
+
+def _title_words(title: str) -> List[str]:
+    return [w for w in _WORD.findall(title.lower()) if w not in _STOPWORDS]
+
+
+def map_issues_to_sections(issues: List[str], sections: List[Section]) -> Tuple[Dict[str, List[str]], List[str]]:
+    """
+    Assign each critic issue to the section(s) whose title it names. Returns the
+    per-section issue lists and the issues that could not be attributed (for
+    example a section that is missing entirely, or a report-wide complaint).
+    """
+    by_section: Dict[str, List[str]] = {}
+    unmapped: List[str] = []
+    titled = [(s.title, _title_words(s.title)) for s in sections if s.title]
+    for issue in issues:
+        text = issue.lower()
+        words = set(_WORD.findall(text))
+        hits: List[str] = []
+        for title, title_words in titled:
+            if title.lower() in text or (title_words and all(w in words for w in title_words)):
+                hits.append(title)
+        if not hits:
+            unmapped.append(issue)
+        for title in hits:
+            by_section.setdefault(title, []).append(issue)
+    return by_section, unmapped
+
@@ -0,0 +1,465 @@
+import json
+import os
+import queue
+import socketserver
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .batch import BatchJob, job_args, parse_job
+from .cache import CacheStore
+from .cli import build_parser, init_process, replay_layer, run_job
+from .extract import shutdown_parse_pool
+from .http import configure_session
+from .log import get_logger
+from .output import partial_path
+from .trace import Span, Tracer
+
+
+logger = get_logger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+TERMINAL = ("ok", "failed")
+# Span names reported as progress events; per-call "llm" spans are left out.
+PROGRESS_SPANS = frozenset(
+    ["plan", "research", "search", "fetch", "notes", "dedup", "pack", "write", "revise", "section", "critic", "pdf"]
+)
+MAX_BODY_BYTES = 1024 * 1024
+FOLLOW_POLL_S = 15.0
+
+
+class JobStore:
+    """Jobs persisted in SQLite, so queued and interrupted jobs survive a restart."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, spec TEXT NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL, "
+            "started_at REAL, finished_at REAL, summary TEXT, error TEXT, events INTEGER)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "events" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN events INTEGER")
+        self._lock = threading.Lock()
+
+    def _row(self, row: Tuple) -> Dict[str, Any]:
+        job_id, spec, status, created_at, started_at, finished_at, summary, error, events = row
+        return {
+            "id": job_id,
+            **json.loads(spec),
+            "status": status,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "summary": json.loads(summary) if summary else None,
+            "error": error,
+            # Event count, stored when the job finishes.
+            "events": events,
+        }
+
+    def add(self, job: BatchJob) -> bool:
+        spec = {k: v for k, v in asdict(job).items() if k != "job_id"}
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, spec, status, created_at) VALUES (?, ?, ?, ?)",
+                    (job.job_id, json.dumps(spec, ensure_ascii=False), QUEUED, time.time()),
+                )
+            except sqlite3.IntegrityError:
+                return False
+        return True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def list(self, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row(r) for r in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        if "summary" in fields:
+            fields["summary"] = json.dumps(fields["summary"], ensure_ascii=False, default=str)
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def resume(self) -> List[str]:
+        """Ids to run after a restart, oldest first; jobs cut off mid-run are queued again."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING))
+            rows = self._conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)).fetchall()
+        return [r[0] for r in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobEvents:
+    """
+    Progress events of one job, appended by its worker and mirrored to
+    `events.jsonl` in the job directory. Readers wait for new events with `since`.
+    Once `done`, the events are read-only.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.events: List[Dict[str, Any]] = []
+        self.done = False
+        self._cond = threading.Condition()
+
+    @classmethod
+    def load(cls, path: Path, done: bool) -> "JobEvents":
+        """Events already written by an earlier process, e.g. for a job queued before a restart."""
+        events = cls(path)
+        if path.exists():
+            events.events = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line]
+        events.done = done
+        return events
+
+    def add(self, event: str, **fields: Any) -> None:
+        with self._cond:
+            if self.done:
+                raise RuntimeError(f"events of a finished job are read-only ({self.path})")
+            record = {"seq": len(self.events), "time": round(time.time(), 3), "event": event, **fields}
+            self.events.append(record)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    def since(self, after: int, timeout: Optional[float] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Events with seq >= `after`, waiting up to `timeout` for some, and whether the job is done."""
+        with self._cond:
+            if timeout:
+                self._cond.wait_for(lambda: len(self.events) > after or self.done, timeout=timeout)
+            return self.events[after:], self.done
+
+
+class ReportService:
+    """
+    Runs submitted report jobs on `workers` threads against one warm process:
+    the LLM client, rate limiter and memo, the HTTP session and `cache` stay
+    loaded between jobs. Jobs are persisted in `<outdir>/jobs.sqlite3` and
+    write to `<outdir>/jobs/<id>/` like batch mode.
+    """
+
+    def __init__(self, args, cache: CacheStore, workers: int = 2):
+        self.args = args
+        self.cache = cache
+        self.workers = max(1, workers)
+        self.root = Path(args.outdir)
+        self.store = JobStore(self.root / "jobs.sqlite3")
+        # None wakes a worker to exit; see stop().
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._stopping = threading.Event()
+        self._events: Dict[str, JobEvents] = {}
+        self._events_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        resumed = self.store.resume()
+        for job_id in resumed:
+            self._queue.put(job_id)
+        if resumed:
+            logger.info("Resuming %d queued job(s)", len(resumed))
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"service-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info("Report service started workers=%d outdir=%s", self.workers, self.root)
+
+    def stop(self) -> None:
+        """
+        Take no further jobs and wait for the running ones to finish. Jobs still
+        queued stay queued in the store and resume on the next start.
+        """
+        self._stopping.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        running = self.store.counts().get(RUNNING, 0)
+        if running:
+            logger.info("Waiting for %d running job(s) to finish", running)
+        for t in self._threads:
+            t.join()
+        self._threads.clear()
+
+    def job_dir(self, job_id: str) -> Path:
+        return self.root / "jobs" / job_id
+
+    def submit(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate and queue a job; raises ValueError for a bad spec or a duplicate id."""
+        if not row.get("id"):
+            row = {**row, "id": uuid.uuid4().hex[:12]}
+        job = parse_job(row, 0, "job")
+        if not self.store.add(job):
+            raise ValueError(f"job id {job.job_id!r} already exists")
+        self.job_dir(job.job_id).mkdir(parents=True, exist_ok=True)
+        self.events(job.job_id).add("queued")
+        self._queue.put(job.job_id)
+        logger.info("Queued job %s topic=%r", job.job_id, job.topic)
+        return self.status(job.job_id)
+
+    def events(self, job_id: str) -> JobEvents:
+        """
+        Live events of a queued or running job (shared with its worker), or a
+        read-only view of a finished job's events.jsonl that is not kept.
+        """
+        with self._events_lock:
+            events = self._events.get(job_id)
+            if events is not None:
+                return events
+            record = self.store.get(job_id)
+            path = self.job_dir(job_id) / "events.jsonl"
+            # A job is marked finished only after its last event is written, so the file is complete.
+            if record is not None and record["status"] in TERMINAL:
+                return JobEvents.load(path, done=True)
+            events = self._events[job_id] = JobEvents.load(path, done=False)
+            return events
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        record = self.store.get(job_id)
+        if record is None:
+            return None
+        record["outdir"] = str(self.job_dir(job_id))
+        if record["status"] not in TERMINAL:
+            record["events"] = len(self.events(job_id).events)
+        return record
+
+    def health(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "queued": self._queue.qsize(), "jobs": self.store.counts()}
+
+    def _work(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is None or self._stopping.is_set():
+                return
+            try:
+                self._run(job_id)
+            except Exception:
+                logger.exception("Job %s crashed the worker loop", job_id)
+
+    def _run(self, job_id: str) -> None:
+        record = self.store.get(job_id)
+        if record is None or record["status"] != QUEUED:
+            return
+        job = BatchJob(job_id, record["topic"], record["audience"], record["length"], record["urls"])
+        args = job_args(self.args, job)
+        outdir = Path(args.outdir)
+        outdir.mkdir(parents=True, exist_ok=True)
+        events = self.events(job_id)
+        self.store.update(job_id, status=RUNNING, started_at=time.time())
+        events.add("started")
+        logger.info("Job %s started", job_id)
+
+        def on_span(kind: str, span: Span) -> None:
+            if span.name not in PROGRESS_SPANS:
+                return
+            fields = {k: span.attrs[k] for k in ("url", "title", "error") if k in span.attrs}
+            if kind == "end":
+                fields["duration_s"] = round(span.duration, 3)
+            events.add(f"{span.name}.{kind}", **fields)
+
+        try:
+            summary = run_job(args, outdir, self.cache, tracer=Tracer(listener=on_span))
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            error = f"{type(e).__name__}: {e}"
+            events.add("failed", error=error)
+            self.store.update(job_id, status="failed", finished_at=time.time(), error=error, events=len(events.events))
+        else:
+            events.add("ok", **summary)
+            self.store.update(job_id, status="ok", finished_at=time.time(), summary=summary, events=len(events.events))
+        finally:
+            events.close()
+            # Later readers get a read-only view of events.jsonl.
+            with self._events_lock:
+                self._events.pop(job_id, None)
+        logger.info("Job %s finished", job_id)
+
+
+def _non_negative_int(value: str, name: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise ValueError(f"{name} must be a non-negative integer, got {value!r}")
+    return number
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """
+    JSON API:
+
+    - POST /jobs                   submit {"topic", "audience", "length", "urls", "id"}
+    - GET  /jobs                   recent jobs
+    - GET  /jobs/<id>              status and run summary
+    - GET  /jobs/<id>/events       progress events (?after=N; ?follow=1 streams NDJSON until done)
+    - GET  /jobs/<id>/report       the latest complete report.md
+    - GET  /jobs/<id>/report/partial  the draft the writer is streaming right now
+    - GET  /healthz                workers and queue depth
+    """
+
+    service: ReportService
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt: str, *args) -> None:
+        logger.debug("service %s", fmt % args)
+
+    def _send(self, status: int, body: Any, content_type: str = "application/json") -> None:
+        text = body if isinstance(body, str) else json.dumps(body, ensure_ascii=False, default=str)
+        raw = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(raw)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send(status, {"error": message})
+
+    def do_POST(self) -> None:
+        if urlsplit(self.path).path.rstrip("/") != "/jobs":
+            # The body is left unread, so the connection cannot be reused.
+            self.close_connection = True
+            return self._error(404, "not found")
+        try:
+            length = _non_negative_int(self.headers.get("Content-Length") or "0", "Content-Length")
+        except ValueError as e:
+            self.close_connection = True
+            return self._error(400, str(e))
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return self._error(413, "request body too large")
+        try:
+            row = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(row, dict):
+                raise ValueError("expected a JSON object")
+            record = self.service.submit(row)
+        except ValueError as e:
+            return self._error(400, str(e))
+        self._send(202, record)
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        query = parse_qs(url.query)
+        if parts == ["healthz"]:
+            return self._send(200, self.service.health())
+        if parts == ["jobs"]:
+            return self._send(200, self.service.store.list())
+        if len(parts) < 2 or parts[0] != "jobs":
+            return self._error(404, "not found")
+        record = self.service.status(parts[1])
+        if record is None:
+            return self._error(404, f"no job {parts[1]!r}")
+        if len(parts) == 2:
+            return self._send(200, record)
+        if parts[2:] in (["report"], ["report", "partial"]):
+            path = Path(record["outdir"]) / "report.md"
+            if parts[3:]:
+                path = partial_path(path)
+            try:
+                text = path.read_text(encoding="utf-8")
+            except FileNotFoundError:
+                return self._error(404, "no draft being written" if parts[3:] else "report not written yet")
+            return self._send(200, text, "text/markdown")
+        if parts[2:] == ["events"]:
+            try:
+                after = _non_negative_int(query.get("after", ["0"])[0], "after")
+            except ValueError as e:
+                return self._error(400, str(e))
+            events = self.service.events(parts[1])
+            if query.get("follow", ["0"])[0] not in ("1", "true"):
+                return self._send(200, events.since(after)[0])
+            return self._follow(events, after)
+        self._error(404, "not found")
+
+    def _follow(self, events: JobEvents, after: int) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        while True:
+            batch, done = events.since(after, timeout=FOLLOW_POLL_S)
+            for event in batch:
+                self.wfile.write((json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+            self.wfile.flush()
+            after += len(batch)
+            if done:
+                return
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port)-style client address.
+        return request, ("local", 0)
+
+
+def make_server(service: ReportService, host: str = "127.0.0.1", port: int = 8080, socket_path: str = ""):
+    handler = type("ServiceHandler", (_Handler,), {"service": service})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        return UnixHTTPServer(socket_path, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main() -> None:
+    p = build_parser(description="Report service: a job queue over a warm pipeline", require_topic=False)
+    p.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    p.add_argument("--port", type=int, default=8080, help="TCP port (ignored with --socket)")
+    p.add_argument("--socket", default="", help="Listen on this Unix socket instead of TCP")
+    p.add_argument("--job-workers", type=int, default=2, help="Reports generated concurrently")
+    args = p.parse_args()
+    if args.topic:
+        p.error("--topic is set per job in service mode; POST jobs to /jobs")
+    init_process(args)
+    configure_session(pool_maxsize=max(args.fetch_workers, args.per_host) * max(1, args.job_workers))
+    cache = CacheStore(outdir=Path(args.outdir), enabled=not args.no_cache, backend=args.cache_backend)
+    with replay_layer(args):
+        service = ReportService(args, cache, workers=args.job_workers)
+        service.start()
+        server = make_server(service, args.host, args.port, args.socket)
+        where = args.socket or "http://%s:%d" % server.server_address[:2]
+        print(f"Report service listening on {where} (Ctrl-C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            service.stop()
+            service.store.close()
+            shutdown_parse_pool()
+            cache.close()
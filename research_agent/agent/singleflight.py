@@ -0,0 +1,58 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the
+    function, later callers with the same key wait for its result (or its
+    exception) instead of running their own. Nothing is kept once the call
+    finishes. Callers may be threads or asyncio tasks.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            # Running futures cannot be cancelled, so a cancelled waiter never
+            # cancels the shared result for everyone else.
+            future.set_running_or_notify_cancel()
+            return future, True
+
+    def _run(self, key: str, future: Future, fn: Callable[[], Any]) -> None:
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._calls.pop(key, None)
+        future.set_result(result)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run `fn` (or join the running call for `key`); returns (result, shared)."""
+        future, leader = self._claim(key)
+        if leader:
+            self._run(key, future, fn)
+        return future.result(), not leader
+
+    async def do_async(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Like `do` for asyncio: a blocking `fn` runs in the loop's default executor."""
+        future, leader = self._claim(key)
+        if leader:
+            asyncio.get_running_loop().run_in_executor(None, self._run, key, future, fn)
+        return await asyncio.wrap_future(future), not leader
@@ -0,0 +1,16 @@
+import re
+
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Local approximation of a BPE token count: long words split into several
+    tokens, punctuation is usually its own token. Close enough for budgeting
+    without a tokenizer dependency.
+    """
+    total = 0
+    for piece in _PIECES.findall(text):
+        total += 1 + len(piece) // 6
+    return total
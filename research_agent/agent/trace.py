@@ -0,0 +1,277 @@
+import datetime as dt
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .log import get_logger
+
+
+logger = get_logger(__name__)
+
+# Numeric span attributes that are summed per span name in the manifest.
+SUMMED_ATTRS = ("input_tokens", "output_tokens", "bytes")
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: int
+    parent: Optional[str]
+    thread: str
+    tid: int
+    start: float
+    duration: float = 0.0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    """
+    Collects spans and counters for one run. Spans nest per thread: a span
+    opened inside another on the same thread records it as its parent (so an
+    LLM call inside note extraction is attributed to "notes").
+
+    `listener`, when given, is called with ("start" | "end", span) as spans
+    open and close, on the thread that runs them.
+    """
+
+    def __init__(self, listener: Optional[Callable[[str, Span], None]] = None):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.listener = listener
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.origin = time.perf_counter()
+            self.started_at = dt.datetime.utcnow().isoformat() + "Z"
+            self.spans: List[Span] = []
+            self.counters: Counter = Counter()
+            self._ids = itertools.count(1)
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Span]:
+        stack = self._stack()
+        thread = threading.current_thread()
+        current = Span(
+            name=name,
+            span_id=next(self._ids),
+            parent=stack[-1].name if stack else None,
+            thread=thread.name,
+            tid=thread.ident or 0,
+            start=time.perf_counter() - self.origin,
+            attrs=attrs,
+        )
+        stack.append(current)
+        self._notify("start", current)
+        try:
+            yield current
+        except BaseException as e:
+            current.set(error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            current.duration = time.perf_counter() - self.origin - current.start
+            # Not always the top: a span held open by an abandoned generator closes late.
+            stack.remove(current)
+            with self._lock:
+                self.spans.append(current)
+            self._notify("end", current)
+
+    def _notify(self, event: str, current: Span) -> None:
+        if self.listener is None:
+            return
+        try:
+            self.listener(event, current)
+        except Exception:
+            logger.exception("Trace listener failed on %s %s", event, current.name)
+
+    def annotate(self, **attrs: Any) -> None:
+        """Set attributes on the innermost open span of the calling thread, if any."""
+        stack = self._stack()
+        if stack:
+            stack[-1].set(**attrs)
+
+    def current(self) -> Optional[str]:
+        """Name of the innermost open span of the calling thread (the stage an LLM call belongs to)."""
+        stack = self._stack()
+        return stack[-1].name if stack else None
+
+    def add(self, counter: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[counter] += value
+
+    def counter_values(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.counters)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per span name: count, total/max seconds and summed token/byte attributes."""
+        out: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for s in spans:
+            agg = out.setdefault(s.name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            agg["count"] += 1
+            agg["total_s"] += s.duration
+            agg["max_s"] = max(agg["max_s"], s.duration)
+            for attr in SUMMED_ATTRS:
+                if isinstance(s.attrs.get(attr), (int, float)):
+                    agg[attr] = agg.get(attr, 0) + s.attrs[attr]
+        for agg in out.values():
+            agg["total_s"] = round(agg["total_s"], 4)
+            agg["max_s"] = round(agg["max_s"], 4)
+        return out
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Cache lookups per namespace recorded by `CacheStore.get` while this tracer was current."""
+        out: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for name, value in self.counter_values().items():
+            if name.startswith("cache."):
+                namespace, _, kind = name[6:].rpartition(".")
+                out[namespace][kind] = int(value)
+        return dict(out)
+
+    def llm_by_stage(self) -> Dict[str, Dict[str, int]]:
+        out: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+        with self._lock:
+            spans = [s for s in self.spans if s.name == "llm"]
+        for s in spans:
+            agg = out[s.parent or "other"]
+            agg["calls"] += 1
+            agg["input_tokens"] += s.attrs.get("input_tokens") or 0
+            agg["output_tokens"] += s.attrs.get("output_tokens") or 0
+        return dict(out)
+
+    def fetches(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            spans = [s for s in self.spans if s.name == "fetch"]
+        return [{"duration_s": round(s.duration, 4), **s.attrs} for s in sorted(spans, key=lambda s: s.start)]
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Spans as Chrome trace "complete" events (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        events = [
+            {
+                "name": s.name,
+                "ph": "X",
+                "ts": round(s.start * 1e6),
+                "dur": round(s.duration * 1e6),
+                "pid": pid,
+                "tid": s.tid,
+                "args": {k: v for k, v in s.attrs.items() if isinstance(v, (str, int, float, bool))},
+            }
+            for s in spans
+        ]
+        threads = {s.tid: s.thread for s in spans}
+        events += [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+_tracer = Tracer()
+# A run (or a batch job) installs its own tracer with `use_tracer`; threads it
+# starts pick it up through `bind`.
+_current: ContextVar[Tracer] = ContextVar("tracer", default=_tracer)
+
+
+def get_tracer() -> Tracer:
+    return _current.get()
+
+
+@contextmanager
+def use_tracer(tracer: Tracer) -> Iterator[Tracer]:
+    token = _current.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current.reset(token)
+
+
+def bind(fn: Callable) -> Callable:
+    """
+    Wrap `fn` to run with the caller's current tracer. Threads and executor
+    workers do not inherit context variables, so work handed to them is bound.
+    """
+    tracer = get_tracer()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _current.set(tracer)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return wrapper
+
+
+def span(name: str, **attrs: Any):
+    return get_tracer().span(name, **attrs)
+
+
+def annotate(**attrs: Any) -> None:
+    get_tracer().annotate(**attrs)
+
+
+def traced(name: str):
+    """Decorator form of `span` for whole-stage functions."""
+
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with get_tracer().span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def build_manifest(run: Dict[str, Any], cache_stats: Dict[str, Dict[str, int]]) -> Dict[str, Any]:
+    tracer = get_tracer()
+    counters = tracer.counter_values()
+    cache = {}
+    for namespace, stats in sorted(cache_stats.items()):
+        hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+        cache[namespace] = {"hits": hits, "misses": misses, "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else None}
+    return {
+        "run": run,
+        "started_at": tracer.started_at,
+        "wall_s": round(time.perf_counter() - tracer.origin, 3),
+        "stages": tracer.summary(),
+        "llm": {"totals": {k[4:]: v for k, v in counters.items() if k.startswith("llm.")}, "by_stage": tracer.llm_by_stage()},
+        "fetch": tracer.fetches(),
+        "cache": cache,
+        "counters": counters,
+    }
+
+
+def write_manifest(path: Path, manifest: Dict[str, Any]) -> None:
+    path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False, default=str), encoding="utf-8")
+    logger.info("Wrote run manifest %s", path)
+
+
+def write_chrome_trace(path: Path) -> None:
+    path.write_text(json.dumps(get_tracer().chrome_trace()), encoding="utf-8")
+    logger.info("Wrote Chrome trace %s", path)
@@ -1,29 +1,37 @@
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
 
 from .cache import CacheStore
+from .keys import llm_key
 from .log import get_logger
-from .llm import llm_json, llm_text
-from .models import CriticResult, Note
+from .llm import llm_json, llm_text, llm_text_stream
+from .models import CriticResult, Note, Section
+from .packing import fit_report
 from .prompts import (
     CRITIC_SYSTEM,
     PLANNER_SYSTEM,
+    SECTION_WRITER_SYSTEM,
     WRITER_SYSTEM,
     make_critic_user,
     make_planner_user,
+    make_section_user,
     make_writer_user,
 )
+from .sections import join_sections, map_issues_to_sections, split_sections
+from .trace import annotate, bind, traced
 
 
 logger = get_logger(__name__)
 
 
+@traced("plan")
 def build_plan(topic: str, audience: str, length: str, model: str, cache: CacheStore) -> str:
-    key = f"plan::{topic}::{audience}::{length}"
+    planner_user = make_planner_user(topic=topic, audience=audience, length=length)
+    key = llm_key("plan", model, PLANNER_SYSTEM, planner_user)
     cached = cache.get("plan", key)
     logger.info("Build plan (%s)", "cache" if cached is not None else "llm")
     if cached is not None:
         return cached.get("text", "")
-    planner_user = make_planner_user(topic=topic, audience=audience, length=length)
     # logger.info("make_planner_user() output=%s", planner_user)
     plan = llm_text(
         model=model,
@@ -34,23 +42,144 @@ def build_plan(topic: str, audience: str, length: str, model: str, cache: CacheS
     return plan
 
 
-def write_report(topic: str, audience: str, length: str, plan: str, notes: List[Note], model: str) -> str:
+@traced("write")
+def write_report(
+    topic: str,
+    audience: str,
+    length: str,
+    plan: str,
+    notes: List[Note],
+    model: str,
+    on_line: Optional[Callable[[str], None]] = None,
+    cache: Optional[CacheStore] = None,
+    issues: Optional[List[str]] = None,
+) -> str:
+    """
+    Generate the report. When `on_line` is given the response is streamed and each
+    completed line is passed to it as soon as it arrives. A cached report for the
+    identical prompt is replayed through `on_line` without an LLM call. `issues`
+    are the critic's complaints about the draft being replaced by a full rewrite.
+    """
     logger.info("Writing report with %d note(s)", len(notes))
-    writer_user = make_writer_user(topic=topic, audience=audience, length=length, plan=plan, notes=notes, has_sources=bool(notes))
-    # logger.info("make_writer_user() output=%s", writer_user)
-    return llm_text(
-        model=model,
-        system=WRITER_SYSTEM,
-        user=writer_user,
+    writer_user = make_writer_user(
+        topic=topic, audience=audience, length=length, plan=plan, notes=notes, has_sources=bool(notes), issues=issues
     )
+    # logger.info("make_writer_user() output=%s", writer_user)
+    key = llm_key("report", model, WRITER_SYSTEM, writer_user)
+    cached = cache.get("report", key) if cache is not None else None
+    logger.info("Write report (%s)", "cache" if cached is not None else "llm")
+    if cached is not None:
+        text = cached.get("text", "")
+        if on_line is not None:
+            for line in text.splitlines():
+                on_line(line)
+        return text
+
+    if on_line is None:
+        text = llm_text(
+            model=model,
+            system=WRITER_SYSTEM,
+            user=writer_user,
+        )
+    else:
+        parts: List[str] = []
+        # Fragments of the line in progress; only each new delta is scanned for newlines.
+        pending: List[str] = []
+        for delta in llm_text_stream(model=model, system=WRITER_SYSTEM, user=writer_user):
+            parts.append(delta)
+            if "\n" not in delta:
+                pending.append(delta)
+                continue
+            first, *complete, rest = delta.split("\n")
+            on_line("".join(pending) + first)
+            for line in complete:
+                on_line(line)
+            pending = [rest]
+        tail = "".join(pending)
+        if tail:
+            on_line(tail)
+        text = "".join(parts)
+    if cache is not None:
+        cache.set("report", key, {"text": text})
+    return text
+
+
+@traced("revise")
+def revise_report(
+    topic: str,
+    audience: str,
+    report_markdown: str,
+    issues: List[str],
+    notes: List[Note],
+    model: str,
+    workers: int = 4,
+    cache: Optional[CacheStore] = None,
+) -> Optional[str]:
+    """
+    Regenerate only the sections the critic flagged, in parallel, and splice them
+    back into the report. Returns None when some issue cannot be tied to an
+    existing section (e.g. a missing section), in which case the caller should
+    fall back to a full `write_report`.
+    """
+    sections = split_sections(report_markdown)
+    by_section, unmapped = map_issues_to_sections(issues, sections)
+    if unmapped or not by_section:
+        logger.info("Section rewrite not possible (%d unattributed issue(s)); full rewrite", len(unmapped))
+        return None
+
+    titles = [s.title for s in sections if s.title]
+    targets = [(idx, s) for idx, s in enumerate(sections) if s.title in by_section]
+    logger.info("Rewriting %d/%d section(s): %s", len(targets), len(titles), ", ".join(s.title for _, s in targets))
+
+    @traced("section")
+    def rewrite(section: Section) -> Section:
+        annotate(title=section.title)
+        section_user = make_section_user(
+            topic=topic,
+            audience=audience,
+            section_title=section.title,
+            section_body=section.body,
+            issues=by_section[section.title],
+            other_titles=[t for t in titles if t != section.title],
+            notes=notes,
+            has_sources=bool(notes),
+        )
+        key = llm_key("section", model, SECTION_WRITER_SYSTEM, section_user)
+        cached = cache.get("section", key) if cache is not None else None
+        if cached is not None:
+            body = cached.get("text", "")
+        else:
+            body = llm_text(model=model, system=SECTION_WRITER_SYSTEM, user=section_user)
+            if cache is not None:
+                cache.set("section", key, {"text": body})
+        # Models sometimes echo the heading despite instructions.
+        lines = body.strip().splitlines()
+        if lines and lines[0].lstrip("# ").strip().lower() == section.title.lower():
+            lines = lines[1:]
+        return Section(title=section.title, body="\n".join(lines).strip("\n"))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(targets))), thread_name_prefix="section") as pool:
+        rewritten = list(pool.map(bind(lambda t: rewrite(t[1])), targets))
+    for (idx, _), section in zip(targets, rewritten):
+        sections[idx] = section
+    return join_sections(sections)
 
 
-def critic_report(topic: str, report_markdown: str, source_count: int, model: str, cache: CacheStore) -> CriticResult:
-    key = f"review::{topic}::sources={source_count}::len={len(report_markdown)}"
+@traced("critic")
+def critic_report(
+    topic: str,
+    report_markdown: str,
+    source_count: int,
+    model: str,
+    cache: CacheStore,
+    token_budget: int = 0,
+) -> CriticResult:
+    report_markdown = fit_report(report_markdown, token_budget)
+    critic_user = make_critic_user(topic=topic, report_markdown=report_markdown, source_count=source_count)
+    key = llm_key("review", model, CRITIC_SYSTEM, critic_user)
     cached = cache.get("review", key)
     logger.info("Critic review (%s)", "cache" if cached is not None else "llm")
     if cached is None:
-        critic_user = make_critic_user(topic=topic, report_markdown=report_markdown, source_count=source_count)
         # logger.info("make_critic_user() output=%s", critic_user)
         payload = llm_json(
             model=model,
@@ -0,0 +1,5 @@
+from agent.batch import main
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Batch mode over the offline corpus: the same jobs run one at a time and with
+several concurrent workers, each pass with a fresh shared cache. Jobs overlap
+in the pages they find, so later jobs hit what earlier ones fetched.
+
+    python -m benchmarks.bench_batch --jobs 12 --workers 4 --llm-latency 0.05
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from agent.batch import BatchJob, run_batch
+from agent.cache import CacheStore
+from agent.cli import build_parser, init_process
+from agent.log import setup_logging
+from agent.replay import Cassette, Fault, Replay, ReplayConfig
+
+from .corpus import TOPICS, SyntheticWorld
+
+
+AUDIENCES = ["Software engineers", "Engineering managers", "SREs", "Security reviewers"]
+
+
+def _jobs(count: int):
+    jobs = []
+    for i in range(count):
+        topic, audience = TOPICS[i % len(TOPICS)], AUDIENCES[(i // len(TOPICS)) % len(AUDIENCES)]
+        jobs.append(BatchJob(job_id=f"job{i:03d}", topic=topic, audience=audience))
+    return jobs
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Batch mode benchmark")
+    p.add_argument("--jobs", type=int, default=12)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--max-sources", type=int, default=8)
+    p.add_argument("--llm-latency", type=float, default=0.05, help="Synthetic seconds per LLM call")
+    p.add_argument("--http-latency", type=float, default=0.02, help="Synthetic seconds per page fetch")
+    args = p.parse_args()
+    setup_logging("WARNING")
+    os.environ.setdefault("OPENAI_API_KEY", "offline")
+    os.environ.setdefault("SERPER_API_KEY", "offline")
+
+    jobs = _jobs(args.jobs)
+    config = ReplayConfig(llm=Fault(latency_s=args.llm_latency), http=Fault(latency_s=args.http_latency))
+    root = Path(tempfile.mkdtemp(prefix="bench-batch-"))
+    print(f"{'pass':<14} {'wall s':>7} {'reports/min':>12} {'job p50 s':>10} {'LLM calls':>10} {'fetch hit':>10} {'notes hit':>10}")
+    try:
+        for name, workers in (("serial", 1), (f"{args.workers} workers", args.workers)):
+            outdir = root / name.replace(" ", "-")
+            base = build_parser(require_topic=False).parse_args(
+                ["--search", "--max-sources", str(args.max_sources), "--outdir", str(outdir)]
+            )
+            init_process(base)
+            cache = CacheStore(outdir=outdir)
+            with Replay(Cassette(), mode="replay", config=config, responder=SyntheticWorld()):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    summary = run_batch(jobs, base, cache, workers=workers)
+            cache.close()
+            hit = lambda ns: summary["cache"].get(ns, {}).get("hit_ratio") or 0.0  # noqa: E731
+            print(
+                f"{name:<14} {summary['wall_s']:>7.2f} {summary['jobs_per_min']:>12.1f} "
+                f"{summary['job_wall_s']['p50']:>10.2f} {int(summary['llm'].get('calls', 0)):>10} "
+                f"{hit('fetch'):>10.2f} {hit('notes'):>10.2f}"
+            )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Compare CacheStore backends at 10k+ entries against the original cache layout
+(one pretty-printed JSON file per entry, `mkdir` on every get/set).
+
+    python -m benchmarks.bench_cache --entries 10000
+"""
+import argparse
+import hashlib
+import json
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from agent.cache import CacheStore
+
+
+class BaselineStore:
+    """The cache as it was before backends existed, reproduced for comparison."""
+
+    def __init__(self, outdir: Path):
+        self.base_dir = Path(outdir) / "cache"
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path_for_key(self, namespace: str, key: str) -> Path:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        ns_dir = self.base_dir / namespace
+        ns_dir.mkdir(parents=True, exist_ok=True)
+        return ns_dir / f"{digest}.json"
+
+    def get(self, namespace: str, key: str):
+        path = self._path_for_key(namespace, key)
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8")).get("value")
+
+    def set(self, namespace: str, key: str, value) -> None:
+        path = self._path_for_key(namespace, key)
+        payload = {"cache_key": key, "value": value}
+        path.write_text(json.dumps(payload, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    def close(self) -> None:
+        pass
+
+
+def _dir_size(path: Path) -> int:
+    # Allocated blocks, not logical size: per-file layouts pay a filesystem block per entry.
+    return sum(p.stat().st_blocks * 512 for p in path.rglob("*") if p.is_file())
+
+
+def _payload(i: int, size: int) -> dict:
+    return {"html": f"<html><title>page {i}</title><body>" + ("lorem ipsum " * (size // 12)) + "</body></html>"}
+
+
+def bench_backend(backend: str, entries: int, size: int, reads: int) -> dict:
+    root = Path(tempfile.mkdtemp(prefix=f"bench-cache-{backend}-"))
+    try:
+        if backend == "baseline":
+            store = BaselineStore(root)
+        else:
+            # The memory tier is disabled so reads measure the backend itself.
+            store = CacheStore(outdir=root, backend=backend, memory_entries=0, policies={})
+        keys = [f"fetch::https://example.com/page/{i}" for i in range(entries)]
+
+        t0 = time.perf_counter()
+        for i, key in enumerate(keys):
+            store.set("fetch", key, _payload(i, size))
+        write_s = time.perf_counter() - t0
+
+        rng = random.Random(7)
+        sample = [rng.choice(keys) for _ in range(reads)]
+        t0 = time.perf_counter()
+        for key in sample:
+            assert store.get("fetch", key) is not None
+        read_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for i in range(reads):
+            store.get("fetch", f"missing::{i}")
+        miss_s = time.perf_counter() - t0
+
+        store.close()
+        return {
+            "backend": backend,
+            "write_ops_s": entries / write_s,
+            "read_ops_s": reads / read_s,
+            "miss_ops_s": reads / miss_s,
+            "disk_mb": _dir_size(root) / 1e6,
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="CacheStore backend benchmark")
+    p.add_argument("--entries", type=int, default=10000)
+    p.add_argument("--size", type=int, default=2000, help="Approximate payload size in bytes")
+    p.add_argument("--reads", type=int, default=5000)
+    args = p.parse_args()
+
+    print(f"entries={args.entries} payload~{args.size}B reads={args.reads}")
+    print(f"{'backend':<9} {'writes/s':>10} {'reads/s':>10} {'misses/s':>10} {'disk MB':>9}")
+    for backend in ("baseline", "file", "sqlite"):
+        r = bench_backend(backend, args.entries, args.size, args.reads)
+        print(
+            f"{r['backend']:<9} {r['write_ops_s']:>10.0f} {r['read_ops_s']:>10.0f} "
+            f"{r['miss_ops_s']:>10.0f} {r['disk_mb']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
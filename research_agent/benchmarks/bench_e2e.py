@@ -0,0 +1,186 @@
+"""
+End-to-end benchmark: drives `cli.run` over the fixed offline corpus with the
+record/replay layer standing in for OpenAI, Serper and the web. Reports
+per-stage wall time, throughput and peak memory for a cold pass (empty cache)
+and a warm pass (same output directory) per topic.
+
+    python -m benchmarks.bench_e2e --llm-latency 0.05 --http-latency 0.02
+    python -m benchmarks.bench_e2e --json bench.json   # machine-readable, for CI
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import shlex
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+from agent import cli
+from agent.log import setup_logging
+from agent.replay import Cassette, Fault, Replay, ReplayConfig
+
+from .corpus import SyntheticWorld, topics
+
+
+# Functions called from `cli.run`, by stage name. Report streaming (ReportSink)
+# is counted under "write".
+STAGES = {
+    "plan": "build_plan",
+    "research": "run_research",
+    "dedup": "dedup_notes",
+    "pack": "pack_notes",
+    "write": "write_report",
+    "revise": "revise_report",
+    "critic": "critic_report",
+    "pdf": "write_report_files",
+}
+
+
+class StageTimer:
+    """Wraps the stage functions in the `cli` module namespace and sums their wall time."""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.research = {"sources": 0, "notes": 0}
+        self._originals = {}
+
+    def __enter__(self) -> "StageTimer":
+        for stage, name in STAGES.items():
+            original = getattr(cli, name)
+            self._originals[name] = original
+            setattr(cli, name, self._wrap(stage, original))
+        return self
+
+    def __exit__(self, *exc) -> None:
+        for name, original in self._originals.items():
+            setattr(cli, name, original)
+
+    def _wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - t0
+                self.calls[stage] += 1
+            if stage == "research":
+                self.research = {"sources": len(result.sources), "notes": len(result.notes)}
+            return result
+
+        return timed
+
+
+def _run_once(topic: str, outdir: Path, extra_args: list, replay: Replay, memory: bool, verbose: bool) -> dict:
+    argv = ["main.py", "--topic", topic, "--search", "--outdir", str(outdir)] + extra_args
+    calls_before = dict(replay.stats)
+    saved_argv = sys.argv
+    sys.argv = argv
+    if memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        with StageTimer() as timer, contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+            cli.run()
+    finally:
+        wall = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1] if memory else 0
+        tracemalloc.stop()
+        sys.argv = saved_argv
+    calls = {k: v - calls_before.get(k, 0) for k, v in replay.stats.items() if v - calls_before.get(k, 0)}
+    research_s = timer.seconds.get("research", 0.0)
+    manifest = json.loads((outdir / "run_manifest.json").read_text(encoding="utf-8"))
+    return {
+        "topic": topic,
+        "wall_s": wall,
+        "peak_mb": peak / 1e6,
+        "stages_s": dict(timer.seconds),
+        "stage_calls": dict(timer.calls),
+        "sources": timer.research["sources"],
+        "notes": timer.research["notes"],
+        "sources_per_s": timer.research["sources"] / research_s if research_s else 0.0,
+        "report_chars": (outdir / "report.md").stat().st_size,
+        "io_calls": calls,
+        "llm_tokens": manifest["llm"]["totals"],
+        "cache": manifest["cache"],
+    }
+
+
+def _print_table(results: list) -> None:
+    stages = [s for s in STAGES if any(s in r["stages_s"] for r in results)]
+    header = f"{'topic':<28} {'pass':<5} {'wall s':>7} {'peak MB':>8} {'src/s':>7} " + " ".join(f"{s:>8}" for s in stages)
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        cells = " ".join(f"{r['stages_s'].get(s, 0.0):>8.3f}" for s in stages)
+        print(
+            f"{r['topic'][:28]:<28} {r['pass']:<5} {r['wall_s']:>7.2f} {r['peak_mb']:>8.1f} "
+            f"{r['sources_per_s']:>7.1f} {cells}"
+        )
+    for name in ("cold", "warm"):
+        rows = [r for r in results if r["pass"] == name]
+        if rows:
+            total = sum(r["wall_s"] for r in rows)
+            print(f"{name}: {total:.2f}s total, {sum(r['sources'] for r in rows) / total:.1f} source(s)/s end to end")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    p.add_argument("--topics", type=int, default=0, help="Number of corpus topics to run (0 = all)")
+    p.add_argument("--max-sources", type=int, default=12)
+    p.add_argument("--llm-latency", type=float, default=0.0, help="Synthetic seconds per LLM call")
+    p.add_argument("--llm-failure-rate", type=float, default=0.0, help="Share of LLM calls that fail (retried by llm.py)")
+    p.add_argument("--search-latency", type=float, default=0.0, help="Synthetic seconds per Serper query")
+    p.add_argument("--http-latency", type=float, default=0.0, help="Synthetic seconds per page fetch")
+    p.add_argument("--http-failure-rate", type=float, default=0.0, help="Share of page fetches that fail")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--cassette", default="", help="Serve recorded responses from this cassette before the corpus")
+    p.add_argument("--cli-args", default="", help="Extra arguments passed to every run, e.g. '--fetch-workers 4'")
+    p.add_argument("--json", default="", help="Write results to this file")
+    p.add_argument("--no-memory", dest="memory", action="store_false", help="Skip tracemalloc (it slows allocation-heavy stages)")
+    p.add_argument("--verbose", action="store_true", help="Keep the pipeline's INFO logging")
+    args = p.parse_args()
+
+    setup_logging("INFO" if args.verbose else "WARNING")
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    # Never sent anywhere: every call is answered by the replay layer.
+    os.environ.setdefault("OPENAI_API_KEY", "offline")
+    os.environ.setdefault("SERPER_API_KEY", "offline")
+
+    config = ReplayConfig(
+        llm=Fault(latency_s=args.llm_latency, failure_rate=args.llm_failure_rate),
+        search=Fault(latency_s=args.search_latency),
+        http=Fault(latency_s=args.http_latency, failure_rate=args.http_failure_rate),
+        seed=args.seed,
+    )
+    cassette = Cassette.load(Path(args.cassette)) if args.cassette else Cassette()
+    extra = ["--max-sources", str(args.max_sources)] + shlex.split(args.cli_args)
+
+    results = []
+    root = Path(tempfile.mkdtemp(prefix="bench-e2e-"))
+    try:
+        with Replay(cassette, mode="replay", config=config, responder=SyntheticWorld()) as replay:
+            for i, topic in enumerate(topics(args.topics)):
+                outdir = root / f"topic{i}"
+                for name in ("cold", "warm"):
+                    result = _run_once(topic, outdir, extra, replay, args.memory, args.verbose)
+                    result["pass"] = name
+                    results.append(result)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    _print_table(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
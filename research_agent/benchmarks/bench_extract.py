@@ -0,0 +1,61 @@
+"""
+HTML extraction throughput: streaming `fast` extractor vs the BeautifulSoup path.
+
+    python -m benchmarks.bench_extract --corpus saved_pages/ --processes 4
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+from agent.extract import EXTRACTORS, TEXT_BUDGET, _run_extractor
+
+
+def _synthetic_corpus(count: int) -> List[Tuple[str, str]]:
+    rng = random.Random(3)
+    words = ["latency", "throughput", "cache", "api", "limit", "quota", "retry", "token", "stream", "index"]
+    pages = []
+    for i in range(count):
+        nav = "<nav>" + "".join(f"<a href='/p{j}'>Link {j}</a>" for j in range(300)) + "</nav>"
+        body = "".join(
+            "<div><p>" + " ".join(rng.choice(words) for _ in range(60)) + "</p></div>" for _ in range(rng.randint(500, 3000))
+        )
+        script = "<script>" + "var x = 1;" * 5000 + "</script>"
+        pages.append((f"https://example.com/{i}", f"<html><head><title>Page {i}</title>{script}</head><body>{nav}{body}</body></html>"))
+    return pages
+
+
+def _load_corpus(path: Path) -> List[Tuple[str, str]]:
+    return [(f.as_uri(), f.read_text(encoding="utf-8", errors="replace")) for f in sorted(path.glob("*.htm*"))]
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="HTML extraction benchmark")
+    p.add_argument("--corpus", default="", help="Directory of saved .html files (synthetic corpus when empty)")
+    p.add_argument("--pages", type=int, default=40, help="Synthetic corpus size")
+    p.add_argument("--processes", type=int, default=4)
+    args = p.parse_args()
+
+    pages = _load_corpus(Path(args.corpus)) if args.corpus else _synthetic_corpus(args.pages)
+    total_mb = sum(len(html) for _, html in pages) / 1e6
+    print(f"pages={len(pages)} size={total_mb:.1f}MB budget={TEXT_BUDGET}")
+    print(f"{'extractor':<10} {'mode':<10} {'pages/s':>9} {'MB/s':>8}")
+    for name in EXTRACTORS:
+        t0 = time.perf_counter()
+        for url, html in pages:
+            _run_extractor(name, html, url, TEXT_BUDGET)
+        elapsed = time.perf_counter() - t0
+        print(f"{name:<10} {'serial':<10} {len(pages) / elapsed:>9.1f} {total_mb / elapsed:>8.1f}")
+
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            pool.submit(_run_extractor, name, "<html></html>", "warmup", TEXT_BUDGET).result()
+            t0 = time.perf_counter()
+            list(pool.map(_run_extractor, [name] * len(pages), [h for _, h in pages], [u for u, _ in pages], [TEXT_BUDGET] * len(pages)))
+            elapsed = time.perf_counter() - t0
+        print(f"{name:<10} {f'pool x{args.processes}':<10} {len(pages) / elapsed:>9.1f} {total_mb / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
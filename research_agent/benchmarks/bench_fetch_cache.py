@@ -0,0 +1,76 @@
+"""
+Fetch-cache layout benchmark: inline raw HTML (parse on every hit) vs compressed
+content-addressed blobs with stored clean text.
+
+    python -m benchmarks.bench_fetch_cache --pages 500
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from agent.cache import CacheStore
+from agent.extract import bs4_extract as _parse_html
+
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _page(i: int, rng: random.Random) -> str:
+    words = ["latency", "throughput", "cache", "api", "limit", "quota", "retry", "token", "stream", "index"]
+    nav = "<nav>" + "".join(f"<a href='/p{j}'>Link {j}</a>" for j in range(200)) + "</nav>"
+    paras = "".join(
+        "<p>" + " ".join(rng.choice(words) for _ in range(80)) + "</p>" for _ in range(300)
+    )
+    script = "<script>" + "var x = 1;" * 2000 + "</script>"
+    return f"<html><head><title>Page {i}</title>{script}</head><body>{nav}{paras}</body></html>"
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Fetch cache layout benchmark")
+    p.add_argument("--pages", type=int, default=500)
+    p.add_argument("--mirror-ratio", type=float, default=0.2, help="Share of URLs that mirror another page")
+    args = p.parse_args()
+
+    rng = random.Random(11)
+    unique = [_page(i, rng) for i in range(max(1, int(args.pages * (1 - args.mirror_ratio))))]
+    pages = [(f"https://site{i}.example/doc", unique[i % len(unique)]) for i in range(args.pages)]
+
+    root = Path(tempfile.mkdtemp(prefix="bench-fetch-cache-"))
+    try:
+        inline = CacheStore(outdir=root / "inline", memory_entries=0, policies={})
+        blobs = CacheStore(outdir=root / "blobs", memory_entries=0, policies={})
+        for url, html in pages:
+            key = f"fetch::{url}"
+            inline.set("fetch", key, {"html": html})
+            title, text = _parse_html(html, url)
+            blobs.set("fetch", key, {"blob": blobs.put_blob(html.encode("utf-8")), "title": title, "text": text})
+
+        t0 = time.perf_counter()
+        for url, _ in pages:
+            _parse_html(inline.get("fetch", f"fetch::{url}")["html"], url)
+        inline_hit_s = (time.perf_counter() - t0) / len(pages)
+
+        t0 = time.perf_counter()
+        for url, _ in pages:
+            blobs.get("fetch", f"fetch::{url}")["text"]
+        blob_hit_s = (time.perf_counter() - t0) / len(pages)
+
+        inline.close()
+        blobs.close()
+        inline_mb = _dir_size(root / "inline") / 1e6
+        blob_mb = _dir_size(root / "blobs") / 1e6
+        print(f"pages={args.pages} unique={len(unique)}")
+        print(f"{'layout':<8} {'disk MB':>9} {'hit ms':>9}")
+        print(f"{'inline':<8} {inline_mb:>9.1f} {inline_hit_s * 1000:>9.2f}")
+        print(f"{'blobs':<8} {blob_mb:>9.1f} {blob_hit_s * 1000:>9.2f}")
+        print(f"disk x{inline_mb / blob_mb:.1f}  hit latency x{inline_hit_s / blob_hit_s:.1f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
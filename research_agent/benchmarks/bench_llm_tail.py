@@ -0,0 +1,116 @@
+"""
+LLM tail latency under a fake client with a slow tail and transient errors:
+the same call sequence with no policy, with retries and attempt timeouts, and
+with hedging added. Reports latency percentiles, failed calls and the extra
+requests each policy sent.
+
+    python -m benchmarks.bench_llm_tail --calls 200 --slow-rate 0.03 --error-rate 0.05
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from agent import llm
+from agent.log import setup_logging
+from agent.retry import CallPolicy
+from agent.trace import span
+
+
+class TransientError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FlakyClient:
+    """Stands in for `OpenAI()`: draws latency and failures per request from a fixed seed."""
+
+    def __init__(self, latency_s: float, slow_rate: float, slow_s: float, error_rate: float, hang_rate: float, seed: int):
+        self.latency_s = latency_s
+        self.slow_rate = slow_rate
+        self.slow_s = slow_s
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.requests = 0
+        self.responses = self
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def create(self, model: str, input: list, stream: bool = False, **kwargs):
+        with self._lock:
+            self.requests += 1
+            draw = self._rng.random()
+            status = self._rng.choice((429, 500, 503))
+        if draw < self.error_rate:
+            time.sleep(self.latency_s / 2)
+            raise TransientError(status)
+        draw -= self.error_rate
+        if draw < self.hang_rate:
+            # Stalled connection: only an attempt timeout gets the caller out.
+            time.sleep(self.slow_s * 10)
+        elif draw < self.hang_rate + self.slow_rate:
+            time.sleep(self.slow_s)
+        else:
+            time.sleep(self.latency_s)
+        usage = SimpleNamespace(input_tokens=100, output_tokens=50, total_tokens=150)
+        return SimpleNamespace(output_text="ok", usage=usage)
+
+
+def _percentile(values: list, q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="LLM deadline/retry/hedging benchmark")
+    p.add_argument("--calls", type=int, default=200)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--latency", type=float, default=0.05, help="Typical seconds per request")
+    p.add_argument("--slow-rate", type=float, default=0.03, help="Share of requests that take --slow")
+    p.add_argument("--slow", type=float, default=1.0, help="Seconds for a slow request")
+    p.add_argument("--hang-rate", type=float, default=0.01, help="Share of requests that stall for 10x --slow")
+    p.add_argument("--error-rate", type=float, default=0.05, help="Share of requests failing with 429/5xx")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+    setup_logging("ERROR")
+    # Every policy sends the same prompts; the memo would answer all but the first pass.
+    llm.configure_memo(0)
+
+    fast = {"backoff_base_s": args.latency, "rate_limit_base_s": args.latency * 2}
+    policies = {
+        "none": CallPolicy(max_attempts=1),
+        "retry+timeout": CallPolicy(attempt_timeout_s=args.slow * 2, **fast),
+        "retry+timeout+hedge": CallPolicy(attempt_timeout_s=args.slow * 2, hedge=True, **fast),
+    }
+    print(f"{'policy':<20} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'failed':>7} {'requests':>9}  retries/hedges")
+    for name, policy in policies.items():
+        client = FlakyClient(args.latency, args.slow_rate, args.slow, args.error_rate, args.hang_rate, args.seed)
+        llm.set_client(client)
+        llm.configure_call_policy(policy)
+        llm._latency.clear()
+        before = llm.get_llm_stats()
+
+        def call(i: int):
+            t0 = time.perf_counter()
+            try:
+                with span("notes"):
+                    llm.llm_text("model", "system", f"prompt {i}")
+            except Exception:
+                return None
+            return time.perf_counter() - t0
+
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(call, range(args.calls)))
+        times = sorted(t for t in results if t is not None)
+        stats = {k: v - before.get(k, 0) for k, v in llm.get_llm_stats().items()}
+        print(
+            f"{name:<20} {_percentile(times, 0.5) * 1000:>8.0f} {_percentile(times, 0.95) * 1000:>8.0f} "
+            f"{_percentile(times, 0.99) * 1000:>8.0f} {(times[-1] if times else 0) * 1000:>8.0f} "
+            f"{results.count(None):>7} {client.requests:>9}  {stats.get('retries', 0)}/{stats.get('hedges', 0)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
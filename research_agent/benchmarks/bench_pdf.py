@@ -0,0 +1,83 @@
+"""
+PDF export benchmark: cached-width layout engine vs the previous per-word
+`stringWidth` of the whole candidate line.
+
+    python -m benchmarks.bench_pdf --pages 120
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from agent import pdf_export
+from agent.pdf_export import markdown_to_pdf
+
+
+def _legacy_wrap_text(text: str, max_width: float, font_name: str, font_size: int):
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    words = text.split()
+    lines = []
+    cur = []
+    for w in words:
+        test = (" ".join(cur + [w])).strip()
+        if stringWidth(test, font_name, font_size) <= max_width:
+            cur.append(w)
+        else:
+            if cur:
+                lines.append(" ".join(cur))
+            cur = [w]
+    if cur:
+        lines.append(" ".join(cur))
+    return lines
+
+
+def _report(pages: int) -> str:
+    rng = random.Random(5)
+    words = ["latency", "throughput", "cache", "p99", "[S3]", "rollout", "canary", "budget", "tokens", "retries"]
+    out = ["# Benchmark report", ""]
+    # Each section fills roughly one page at 11pt.
+    for section in range(pages):
+        out.append(f"## Section {section}")
+        for _ in range(4):
+            out.append(" ".join(rng.choice(words) for _ in range(rng.randint(60, 160))))
+            out.append("")
+        for _ in range(4):
+            out.append("- " + " ".join(rng.choice(words) for _ in range(rng.randint(15, 40))))
+        out.append("- see https://example.com/" + "a" * 300)
+        out.append("")
+    return "\n".join(out)
+
+
+def _time(markdown: str, out: Path, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        markdown_to_pdf(markdown, out)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="PDF export benchmark")
+    p.add_argument("--pages", type=int, default=120, help="Approximate report length in pages")
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+
+    markdown = _report(args.pages)
+    with tempfile.TemporaryDirectory() as tmp:
+        new_s = _time(markdown, Path(tmp) / "new.pdf", args.repeat)
+        current = pdf_export._wrap_text
+        pdf_export._wrap_text = _legacy_wrap_text
+        try:
+            old_s = _time(markdown, Path(tmp) / "old.pdf", args.repeat)
+        finally:
+            pdf_export._wrap_text = current
+    print(f"chars={len(markdown)} lines={markdown.count(chr(10))}")
+    print(f"legacy  {old_s:.2f}s")
+    print(f"cached  {new_s:.2f}s  (x{old_s / new_s:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Fetch-cache revalidation against a local HTTP stand-in server: a cold fetch,
+a rerun inside the TTL (no requests), then a rerun after the TTL has expired
+where unchanged pages answer `304 Not Modified` and only edited pages are
+downloaded again. Compared with refetching everything (`--no-cache`). Pages go
+through the research pipeline; notes come from the offline stand-in model in
+`benchmarks/corpus.py`, so the LLM column shows which pages needed new notes.
+
+    python -m benchmarks.bench_revalidate --pages 200 --changed 0.1
+"""
+import argparse
+import hashlib
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from agent import llm
+from agent.cache import CacheStore
+from agent.keys import llm_key
+from agent.log import setup_logging
+from agent.pipeline import run_research
+from agent.prompts import NOTES_SYSTEM, make_notes_user
+from agent.replay import Cassette, Replay, ReplayClient
+
+from .corpus import SyntheticWorld
+
+
+class StandIn:
+    """Pages served with ETag and/or Last-Modified validators; counts what was sent."""
+
+    def __init__(self, pages: int, seed: int = 3):
+        rng = random.Random(seed)
+        words = ["latency", "cache", "etag", "revalidate", "origin", "proxy", "ttl", "stale", "fresh", "304"]
+        self.bodies = {}
+        self.modified = {}
+        for i in range(pages):
+            paras = "".join("<p>" + " ".join(rng.choice(words) for _ in range(60)) + "</p>" for _ in range(120))
+            self.bodies[f"/p{i}"] = f"<html><head><title>Page {i}</title></head><body>{paras}</body></html>".encode()
+            self.modified[f"/p{i}"] = time.time() - 3600
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    def edit(self, path: str) -> None:
+        self.bodies[path] = self.bodies[path].replace(b"<body>", b"<body><p>Edited.</p>", 1)
+        self.modified[path] = time.time()
+
+    def handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = site.bodies.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                idx = int(self.path[2:])
+                etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"' if idx % 3 != 1 else None
+                last_modified = formatdate(site.modified[self.path], usegmt=True) if idx % 3 != 0 else None
+                unchanged = (etag and self.headers.get("If-None-Match") == etag) or (
+                    not etag and last_modified and self.headers.get("If-Modified-Since") == last_modified
+                )
+                self.send_response(304 if unchanged else 200)
+                if etag:
+                    self.send_header("ETag", etag)
+                if last_modified:
+                    self.send_header("Last-Modified", last_modified)
+                self.send_header("Cache-Control", "max-age=3600")
+                if unchanged:
+                    self.end_headers()
+                    with site.lock:
+                        site.stats["304"] += 1
+                    return
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with site.lock:
+                    site.stats["200"] += 1
+                    site.stats["bytes"] += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def _notes_keys(sources) -> dict:
+    return {s.url: llm_key("notes", "model", NOTES_SYSTEM, make_notes_user(s)) for s in sources}
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Fetch cache revalidation benchmark")
+    p.add_argument("--pages", type=int, default=200)
+    p.add_argument("--changed", type=float, default=0.1, help="Share of pages edited before the revalidation pass")
+    p.add_argument("--workers", type=int, default=8)
+    args = p.parse_args()
+    setup_logging("WARNING")
+
+    site = StandIn(args.pages)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), site.handler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{server.server_port}/p{i}" for i in range(args.pages)]
+    root = Path(tempfile.mkdtemp(prefix="bench-revalidate-"))
+    ttl_s = 3.0
+    opts = {"fetch_workers": args.workers, "per_host": args.workers, "ttl_s": ttl_s}
+    # Only the model is stood in for; pages come from the local server through the real session.
+    model = Replay(Cassette(), responder=SyntheticWorld())
+    llm.set_client(ReplayClient(model))
+    llm.configure_memo(0)
+
+    def run(name: str, cache: CacheStore):
+        site.stats.clear()
+        calls = model.stats["llm.calls"]
+        t0 = time.perf_counter()
+        state = run_research(urls, [], max_sources=len(urls), model="model", cache=cache, **opts)
+        elapsed = time.perf_counter() - t0
+        print(
+            f"{name:<26} {elapsed * 1000:>9.0f} {site.stats['200']:>6} {site.stats['304']:>6} "
+            f"{site.stats['bytes'] / 1e6:>9.2f} {model.stats['llm.calls'] - calls:>6}"
+        )
+        return state.sources
+
+    try:
+        cache = CacheStore(outdir=root / "cache")
+        print(f"{'pass':<26} {'wall ms':>9} {'200':>6} {'304':>6} {'sent MB':>9} {'LLM':>6}")
+        cold = run("cold", cache)
+        run("rerun within TTL", cache)
+        time.sleep(ttl_s)
+        edited = {f"/p{i}" for i in random.Random(5).sample(range(args.pages), int(args.pages * args.changed))}
+        for path in edited:
+            site.edit(path)
+        revalidated = run("rerun after TTL", cache)
+        run("refetch all (--no-cache)", CacheStore(outdir=root / "nocache", enabled=False))
+
+        before, after = _notes_keys(cold), _notes_keys(revalidated)
+        reused = sum(1 for url in before if before[url] == after[url])
+        print(f"edited pages: {len(edited)}; notes cache keys reused after revalidation: {reused}/{len(urls)}")
+        cache.close()
+    finally:
+        server.shutdown()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
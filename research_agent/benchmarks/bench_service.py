@@ -0,0 +1,136 @@
+"""
+On-demand reports: a fresh `main.py`-style process per request (interpreter
+start-up, imports, client construction, a cold cache per output directory)
+against the report service, with the same requests submitted one at a time
+over HTTP to a warm process. Both run offline over the corpus in
+`benchmarks/corpus.py`.
+
+    python -m benchmarks.bench_service --requests 6 --llm-latency 0.05
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+from agent.cache import CacheStore
+from agent.cli import build_parser, init_process
+from agent.log import setup_logging
+from agent.replay import Cassette, Fault, Replay, ReplayConfig
+from agent.service import ReportService, make_server
+
+from .corpus import TOPICS, SyntheticWorld
+
+
+# Runs one report in a new interpreter, the way each on-demand request did before.
+PROCESS_SCRIPT = """
+import os, sys
+sys.argv = ["main.py"] + sys.argv[1:]
+from agent import cli
+from agent.log import setup_logging
+from agent.replay import Cassette, Fault, Replay, ReplayConfig
+from benchmarks.corpus import SyntheticWorld
+setup_logging("WARNING")
+latency = float(os.environ["BENCH_LLM_LATENCY"])
+config = ReplayConfig(llm=Fault(latency_s=latency), http=Fault(latency_s=latency / 2))
+with Replay(Cassette(), mode="replay", config=config, responder=SyntheticWorld()):
+    cli.run()
+"""
+AUDIENCES = ["Software engineers", "SREs", "Engineering managers"]
+
+
+def _requests(count: int):
+    return [{"topic": TOPICS[i % len(TOPICS)], "audience": AUDIENCES[(i // len(TOPICS)) % len(AUDIENCES)]} for i in range(count)]
+
+
+def _flags(max_sources: int):
+    return ["--search", "--max-sources", str(max_sources), "--iterations", "1"]
+
+
+def _per_process(requests, root: Path, max_sources: int, latency: float):
+    env = {**os.environ, "BENCH_LLM_LATENCY": str(latency), "OPENAI_API_KEY": "offline", "SERPER_API_KEY": "offline"}
+    times = []
+    for i, req in enumerate(requests):
+        argv = ["--topic", req["topic"], "--audience", req["audience"], "--outdir", str(root / f"req{i}")] + _flags(max_sources)
+        t0 = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", PROCESS_SCRIPT] + argv, env=env, check=True, stdout=subprocess.DEVNULL, cwd=Path.cwd()
+        )
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def _post(base: str, body: dict) -> dict:
+    req = urllib.request.Request(
+        f"{base}/jobs", data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(req) as resp:
+        return json.load(resp)
+
+
+def _service(requests, root: Path, max_sources: int, latency: float):
+    args = build_parser(require_topic=False).parse_args(["--outdir", str(root)] + _flags(max_sources))
+    init_process(args)
+    cache = CacheStore(outdir=root)
+    config = ReplayConfig(llm=Fault(latency_s=latency), http=Fault(latency_s=latency / 2))
+    times, events = [], []
+    with Replay(Cassette(), mode="replay", config=config, responder=SyntheticWorld()), contextlib.redirect_stdout(io.StringIO()):
+        service = ReportService(args, cache, workers=1)
+        service.start()
+        server = make_server(service, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = "http://%s:%d" % server.server_address[:2]
+        try:
+            for req in requests:
+                t0 = time.perf_counter()
+                job = _post(base, req)
+                # Follow the progress stream until the job finishes.
+                with urllib.request.urlopen(f"{base}/jobs/{job['id']}/events?follow=1") as resp:
+                    lines = [json.loads(line) for line in resp]
+                times.append(time.perf_counter() - t0)
+                events.append(len(lines))
+                if lines[-1]["event"] != "ok":
+                    raise RuntimeError(f"job {job['id']} ended with {lines[-1]}")
+        finally:
+            server.shutdown()
+            server.server_close()
+            service.stop()
+            service.store.close()
+            cache.close()
+    return times, events
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Report service vs per-request process benchmark")
+    p.add_argument("--requests", type=int, default=6)
+    p.add_argument("--max-sources", type=int, default=8)
+    p.add_argument("--llm-latency", type=float, default=0.05, help="Synthetic seconds per LLM call (page fetches: half)")
+    args = p.parse_args()
+    setup_logging("WARNING")
+    os.environ.setdefault("OPENAI_API_KEY", "offline")
+    os.environ.setdefault("SERPER_API_KEY", "offline")
+
+    requests = _requests(args.requests)
+    root = Path(tempfile.mkdtemp(prefix="bench-service-"))
+    try:
+        process_times = _per_process(requests, root / "process", args.max_sources, args.llm_latency)
+        service_times, events = _service(requests, root / "service", args.max_sources, args.llm_latency)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"{'request':<8} {'topic':<34} {'process s':>10} {'service s':>10} {'events':>7}")
+    for i, req in enumerate(requests):
+        print(f"{i:<8} {req['topic'][:34]:<34} {process_times[i]:>10.2f} {service_times[i]:>10.2f} {events[i]:>7}")
+    print(f"total: per-request process {sum(process_times):.2f}s, service {sum(service_times):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Startup benchmark: wall time of fresh interpreters for `--help` and for a
+fully cached rerun, against importing the heavy dependencies up front (what
+every run paid when they were imported at module load).
+
+    python -m benchmarks.bench_startup --repeat 5
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from agent import cli
+from agent.log import setup_logging
+from agent.replay import Cassette, Replay
+
+from .corpus import SyntheticWorld, topics
+
+
+ROOT = Path(__file__).resolve().parents[1]
+HEAVY = ("openai", "requests", "bs4", "reportlab")
+URLS = ",".join(f"https://docs{i}.example/cache/{i}" for i in range(1, 7))
+
+
+def _populate(outdir: Path, topic: str) -> None:
+    saved = sys.argv
+    sys.argv = ["main.py", "--topic", topic, "--urls", URLS, "--outdir", str(outdir)]
+    try:
+        with Replay(Cassette(), responder=SyntheticWorld()), contextlib.redirect_stdout(io.StringIO()):
+            cli.run()
+    finally:
+        sys.argv = saved
+
+
+def _time(cmd: list, env: dict, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def _loaded(cmd: list, env: dict) -> list:
+    """Heavy top-level packages imported by `cmd` (from -X importtime)."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime"] + cmd[1:], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    names = {line.rsplit("|", 1)[-1].strip() for line in out.stderr.splitlines() if line.startswith("import time:")}
+    return [m for m in HEAVY if m in names]
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="CLI startup benchmark")
+    p.add_argument("--repeat", type=int, default=5)
+    args = p.parse_args()
+
+    setup_logging("WARNING")
+    env = {**os.environ, "OPENAI_API_KEY": "offline", "PYTHONDONTWRITEBYTECODE": "1"}
+    os.environ.setdefault("OPENAI_API_KEY", "offline")
+    root = Path(tempfile.mkdtemp(prefix="bench-startup-"))
+    try:
+        topic = topics(1)[0]
+        outdir = root / "out"
+        _populate(outdir, topic)
+        cases = {
+            "python -c pass": [sys.executable, "-c", "pass"],
+            "eager heavy imports": [sys.executable, "-c", "import openai, requests, bs4, reportlab.pdfgen.canvas"],
+            "main.py --help": [sys.executable, "main.py", "--help"],
+            "cached rerun": [sys.executable, "main.py", "--topic", topic, "--urls", URLS, "--outdir", str(outdir)],
+        }
+        print(f"{'case':<22} {'median s':>9}  heavy modules loaded")
+        for name, cmd in cases.items():
+            seconds = _time(cmd, env, args.repeat)
+            loaded = ", ".join(_loaded(cmd, env)) if cmd[1] == "main.py" else ""
+            print(f"{name:<22} {seconds:>9.3f}  {loaded}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
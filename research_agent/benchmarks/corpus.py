@@ -0,0 +1,159 @@
+"""
+Fixed offline corpus for end-to-end benchmarks: topics, and a deterministic
+responder that answers any LLM prompt, Serper query or page URL the pipeline
+asks for. Used as the `responder` of `agent.replay.Replay`, so a benchmark
+needs no cassette and keeps working when prompts change.
+"""
+import json
+import random
+import re
+import zlib
+from typing import Dict, List, Tuple
+
+from agent.prompts import CRITIC_SYSTEM, NOTES_SYSTEM, PLANNER_SYSTEM, SECTION_WRITER_SYSTEM, WRITER_SYSTEM
+
+
+TOPICS = [
+    "Caching strategy for LLM research agents",
+    "Rate limiting a multi-tenant HTTP API",
+    "Incremental PDF rendering for streamed reports",
+]
+
+SECTIONS = [
+    "TL;DR",
+    "Problem",
+    "Goals / Non-Goals",
+    "Proposed Design",
+    "Failure Modes & Edge Cases",
+    "Performance & Cost",
+    "Security & Privacy",
+    "Testing Plan",
+    "Rollout Plan",
+    "Alternatives Considered",
+]
+
+WORDS = (
+    "latency throughput cache eviction token budget retry backoff queue shard replica "
+    "index stream batch quota p99 rollout canary failover timeout checksum compaction"
+).split()
+
+_CITATION = re.compile(r"\[S(\d+)\]")
+_HOSTS = 12
+
+
+def _rng(*parts: str) -> random.Random:
+    return random.Random(zlib.crc32("\x00".join(parts).encode("utf-8")))
+
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def _field(user: str, name: str) -> str:
+    match = re.search(rf"^{re.escape(name)}: (.*)$", user, re.MULTILINE)
+    return match.group(1).strip() if match else ""
+
+
+class SyntheticWorld:
+    """Deterministic stand-in for the model, Serper and the web."""
+
+    def __init__(self, page_paragraphs: Tuple[int, int] = (20, 120), skip_every: int = 9, error_every: int = 13):
+        self.page_paragraphs = page_paragraphs
+        # Every Nth URL is a PDF (skipped without download) or a 404.
+        self.skip_every = skip_every
+        self.error_every = error_every
+
+    # --- LLM -----------------------------------------------------------------
+    def llm(self, model: str, system: str, user: str) -> str:
+        if system == PLANNER_SYSTEM:
+            return self._plan(_field(user, "Topic"))
+        if system == NOTES_SYSTEM:
+            return self._notes(user)
+        if system == WRITER_SYSTEM:
+            return self._report(_field(user, "Topic"), user)
+        if system == SECTION_WRITER_SYSTEM:
+            return self._section(_field(user, "Section to revise"), user)
+        if system == CRITIC_SYSTEM:
+            return self._critic(_field(user, "Topic"), user)
+        return "OK"
+
+    def _plan(self, topic: str) -> str:
+        lines = ["## Outline"] + [f"- {s}" for s in SECTIONS]
+        lines += ["", "## Research questions"] + [f"- How does {w} affect {topic.lower()}?" for w in WORDS[:6]]
+        lines += ["", "## Queries"] + [f"- {topic.lower()} {w} query" for w in WORDS[:8]]
+        return "\n".join(lines)
+
+    def _notes(self, user: str) -> str:
+        text = user.split("\n\n", 1)[-1]
+        rng = _rng(text[:2000], str(len(text)))
+        count = max(1, min(12, len(text) // 1500))
+        notes = [
+            {
+                "claim": _sentence(rng, rng.randint(8, 16)),
+                "support": _sentence(rng, rng.randint(10, 24)),
+                "tags": rng.sample(["performance", "reliability", "cost", "security", "api"], 2),
+                "confidence": rng.choice(["high", "medium", "low"]),
+            }
+            for _ in range(count)
+        ]
+        return json.dumps({"notes": notes})
+
+    def _report(self, topic: str, user: str) -> str:
+        cited = sorted({int(n) for n in _CITATION.findall(user)}) or [1]
+        rng = _rng(topic, str(len(user)))
+        out = [f"# {topic}", ""]
+        for section in SECTIONS:
+            out += [f"## {section}"]
+            for _ in range(rng.randint(3, 6)):
+                out.append(f"- {_sentence(rng, rng.randint(10, 30))} [S{rng.choice(cited)}]")
+            out.append("")
+        out += ["## References"] + [f"- [S{i}]" for i in cited]
+        return "\n".join(out) + "\n"
+
+    def _section(self, title: str, user: str) -> str:
+        rng = _rng(title, user[:500])
+        return "\n".join(f"- Revised: {_sentence(rng, 20)} p99 12ms [S1]" for _ in range(4))
+
+    def _critic(self, topic: str, user: str) -> str:
+        if "Revised:" in user:
+            return json.dumps({"pass": True, "issues": [], "new_queries": []})
+        return json.dumps(
+            {
+                "pass": False,
+                "issues": ["Performance & Cost section lacks concrete numbers"],
+                "new_queries": [f"{topic.lower()} benchmark numbers"],
+            }
+        )
+
+    # --- Serper --------------------------------------------------------------
+    def search(self, payload: dict) -> dict:
+        query = payload.get("q", "")
+        rng = _rng(query)
+        organic = []
+        for pos in range(payload.get("num", 10)):
+            host = rng.randrange(_HOSTS)
+            organic.append({"link": f"https://docs{host}.example/{rng.choice(WORDS)}/{rng.randrange(40)}", "position": pos})
+        return {"organic": organic}
+
+    # --- Web -----------------------------------------------------------------
+    def http(self, method: str, url: str) -> Tuple[int, Dict[str, str], bytes]:
+        bucket = zlib.crc32(url.encode("utf-8"))
+        if self.error_every and bucket % self.error_every == 0:
+            return 404, {"Content-Type": "text/html"}, b"<html><body>Not found</body></html>"
+        if self.skip_every and bucket % self.skip_every == 0:
+            return 200, {"Content-Type": "application/pdf"}, b"%PDF-1.4"
+        return 200, {"Content-Type": "text/html; charset=utf-8"}, self._page(url).encode("utf-8")
+
+    def _page(self, url: str) -> str:
+        rng = _rng(url)
+        nav = "<nav>" + "".join(f"<a href='/p{j}'>Link {j}</a>" for j in range(60)) + "</nav>"
+        paras = "".join(
+            f"<h2>{rng.choice(WORDS)}</h2><p>" + " ".join(_sentence(rng, rng.randint(8, 20)) for _ in range(6)) + "</p>"
+            for _ in range(rng.randint(*self.page_paragraphs))
+        )
+        script = "<script>" + "var x = 1;" * 500 + "</script>"
+        return f"<html><head><title>{url}</title>{script}</head><body>{nav}<main>{paras}</main></body></html>"
+
+
+def topics(limit: int = 0) -> List[str]:
+    return TOPICS[:limit] if limit > 0 else list(TOPICS)
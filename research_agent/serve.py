@@ -0,0 +1,5 @@
+from agent.service import main
+
+
+if __name__ == "__main__":
+    main()